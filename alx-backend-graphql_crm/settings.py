@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack
+    'crm.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,7 +74,8 @@ TEMPLATES = [
     },
 ]
 
-WSGI_APPLICATION = 'graph.wsgi.application'
+WSGI_APPLICATION = 'alx-backend-graphql_crm.wsgi.application'
+ASGI_APPLICATION = 'alx-backend-graphql_crm.asgi.application'
 
 
 # Database
@@ -81,9 +85,27 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Reuse each thread's connection across requests for up to
+        # CONN_MAX_AGE seconds, checking it is still usable before reuse.
+        # Only for WSGI, which sets CRM_CONN_MAX_AGE (see wsgi.py): under
+        # ASGI every sync_to_async thread would keep a connection that is
+        # not reliably closed, so Django recommends 0 there.
+        'CONN_MAX_AGE': int(os.environ.get('CRM_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# PRAGMAs run on every new SQLite connection (see crm.database); set one to
+# None to keep SQLite's default, or ENABLED to False to skip them all.
+SQLITE_TUNING = {
+    'ENABLED': True,
+    'JOURNAL_MODE': 'WAL',
+    'SYNCHRONOUS': 'NORMAL',
+    'MMAP_SIZE': 256 * 1024 * 1024,
+    'CACHE_SIZE': -64 * 1024,
+    'BUSY_TIMEOUT': 5000,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -128,11 +150,68 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # GraphQL Configuration
 GRAPHENE = {
-    'SCHEMA': 'alx-backend-graphql_crm.schema.schema'
+    'SCHEMA': 'alx-backend-graphql_crm.schema.schema',
+    'MIDDLEWARE': ['crm.profiling.GraphQLProfilingMiddleware'],
 }
 
-# Cron Jobs Configuration
+# Per-operation query counts and latency, served at /metrics. With EXPOSE
+# (defaults to DEBUG), a request sending the HEADER gets the operation's
+# per-field profile in its extensions.
+GRAPHQL_PROFILING = {
+    'ENABLED': True,
+    'HEADER': 'X-GraphQL-Profile',
+    'EXPOSE': None,
+    'WINDOW': 1000,
+}
+
+# Persisted queries: operations in REGISTRY are compiled at startup; other
+# documents are cached after their first request, up to CACHE_SIZE.
+GRAPHQL_PERSISTED_QUERIES = {
+    'REGISTRY': BASE_DIR / 'crm' / 'persisted_queries.json',
+    'CACHE_SIZE': 256,
+    'ONLY_REGISTERED': False,
+}
+
+# Most operations accepted in one batched (JSON array) request
+GRAPHQL_MAX_BATCH_SIZE = 20
+
+# Cache for GraphQL query results; point CACHE_ALIAS at a shared backend
+# (e.g. Redis or Memcached) to share results across workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+GRAPHQL_RESPONSE_CACHE = {
+    'ENABLED': True,
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 300,
+    'SKIP_FIELDS': [],
+}
+
+# Cron Jobs Configuration; run them with `manage.py run_scheduler` (one
+# long-lived process) or install them with django-crontab, not both. These
+# are the only schedules: the system crontab files were replaced by them.
 CRONJOBS = [
     ('*/5 * * * *', 'crm.cron.log_crm_heartbeat'),
     ('0 */12 * * *', 'crm.cron.update_low_stock'),
+    ('0 8 * * *', 'crm.cron_jobs.send_order_reminders.send_order_reminders'),
+    ('0 2 * * 0', 'crm.cron.clean_inactive_customers'),
 ]
+
+# Query cost limits: see crm.complexity for how the cost is estimated.
+GRAPHQL_QUERY_COST = {
+    'MAX_COST': 50000,
+    'MAX_DEPTH': 12,
+    'DEFAULT_LIST_SIZE': 100,
+}
+
+# GraphQL client used by the cron jobs: in-process by default; set
+# IN_PROCESS to False to call URL over a pooled HTTP session instead.
+GRAPHQL_CLIENT = {
+    'IN_PROCESS': True,
+    'URL': 'http://localhost:8000/graphql/',
+    'TIMEOUT': 10,
+    'RETRIES': 3,
+}
@@ -16,10 +16,14 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
+from crm.views import AsyncGraphQLView, PersistedQueryGraphQLView, export_orders, metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path("graphql/", csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path("graphql/", csrf_exempt(PersistedQueryGraphQLView.as_view(graphiql=True))),
+    # Async executor, for deployments served by an ASGI server
+    path("graphql/async/", AsyncGraphQLView.as_view(graphiql=True)),
+    path("exports/orders/", export_orders),
+    path("metrics", metrics),
 ]
@@ -11,6 +11,8 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'graph.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx-backend-graphql_crm.settings')
+# Persistent database connections; left at 0 under ASGI (see settings.py)
+os.environ.setdefault('CRM_CONN_MAX_AGE', '600')
 
 application = get_wsgi_application()
@@ -0,0 +1,98 @@
+from decimal import Decimal
+
+import graphene
+from django.db.models import Avg, Count, DateField, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Trunc
+from graphene_django.filter.utils import get_filtering_args_from_filterset
+
+from .filters import OrderFilter
+from .loaders import get_loaders
+from .models import Customer, Order, Product
+
+
+class OrderStatsGroupBy(graphene.Enum):
+    DAY = 'day'
+    WEEK = 'week'
+    MONTH = 'month'
+    CUSTOMER = 'customer'
+    PRODUCT = 'product'
+
+
+# group_by -> (bucket key, bucket label, amount summed per row). Product
+# buckets read one row per order line, so their amount is the line total
+# rather than the order total.
+GROUPINGS = {
+    'day': (Trunc('order_date', 'day', output_field=DateField()), None, F('total_amount')),
+    'week': (Trunc('order_date', 'week', output_field=DateField()), None, F('total_amount')),
+    'month': (Trunc('order_date', 'month', output_field=DateField()), None, F('total_amount')),
+    'customer': (F('customer_id'), 'customer__name', F('total_amount')),
+    'product': (
+        F('items__product_id'),
+        'items__product__name',
+        ExpressionWrapper(F('items__quantity') * F('items__unit_price'), output_field=DecimalField()),
+    ),
+}
+
+
+CENT = Decimal('0.01')
+
+
+class OrderStatsBucket(graphene.ObjectType):
+    """Totals of the orders in one day, week, month, customer or product."""
+
+    # Read by the response cache, which has no model to go by for this type
+    source_models = (Order, Customer, Product)
+
+    key = graphene.String(required=True, description="Start date of the period, or the customer/product id.")
+    label = graphene.String(description="Customer or product name.")
+    order_count = graphene.Int(required=True)
+    revenue = graphene.Decimal(required=True)
+    average_order_value = graphene.Decimal(required=True)
+
+    def resolve_key(self, info):
+        key = self['key']
+        return key.isoformat() if hasattr(key, 'isoformat') else str(key)
+
+    # SQLite hands sums and averages back at whatever precision the arithmetic
+    # left ("1234.5"), so round them to cents like the stored amounts
+    def resolve_revenue(self, info):
+        return self['revenue'].quantize(CENT)
+
+    def resolve_average_order_value(self, info):
+        return self['average_order_value'].quantize(CENT)
+
+
+def order_stats(queryset, group_by):
+    """Return ``queryset`` aggregated into one row per ``group_by`` bucket, in key order."""
+    key, label, amount = GROUPINGS[group_by]
+    columns = {'key': key}
+    if label:
+        columns['label'] = F(label)
+    return (
+        queryset.annotate(**columns)
+        .values(*columns)
+        .annotate(order_count=Count('pk'), revenue=Sum(amount), average_order_value=Avg(amount))
+        .order_by('key')
+    )
+
+
+def resolve_order_stats(root, info, group_by, **filters):
+    filterset = OrderFilter(
+        {name: value for name, value in filters.items() if value is not None},
+        queryset=Order.objects.all(),
+        request=info.context,
+    )
+    if not filterset.is_valid():
+        raise Exception(filterset.errors.as_text())
+    return get_loaders(info).resolve_list(order_stats(filterset.qs, group_by.value))
+
+
+def order_stats_field(order_type):
+    """Root field aggregating the orders matched by ``OrderFilter`` in one query."""
+    return graphene.List(
+        graphene.NonNull(OrderStatsBucket),
+        required=True,
+        group_by=OrderStatsGroupBy(required=True),
+        resolver=resolve_order_stats,
+        **get_filtering_args_from_filterset(OrderFilter, order_type),
+    )
@@ -0,0 +1,461 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+import django
+from django.conf import settings
+from django.db import reset_queries, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from graphene.utils.str_converters import to_camel_case
+from graphene_django.settings import graphene_settings
+
+from .filters import CustomerFilter, OrderFilter, ProductFilter
+from .models import Customer, Order, OrderItem, Product
+from . import complexity, database, order_items, response_cache, search, stats
+
+# Shape of a synthetic dataset; the same seed always builds the same rows
+Dataset = namedtuple('Dataset', 'customers products orders items_per_order seed', defaults=(1000, 200, 5000, 3, 42))
+
+# ``run(iteration)`` performs one operation; ``mutates`` runs it in a
+# transaction that is rolled back, so every iteration sees the same data.
+Scenario = namedtuple('Scenario', 'name run mutates')
+
+# Flagged when p50 latency grows by more than this fraction over the baseline
+DEFAULT_THRESHOLD = 0.25
+
+ORDER_DAYS = 365
+BATCH_SIZE = 1000
+
+# Run in a fresh interpreter: django.setup(), then the import and build of
+# GRAPHENE['SCHEMA'], as a worker or cron script does on boot
+STARTUP_SCRIPT = """
+import json, os, sys, time
+started = time.perf_counter()
+os.environ['DJANGO_SETTINGS_MODULE'] = sys.argv[1]
+import django
+django.setup()
+ready = time.perf_counter()
+from graphene_django.settings import graphene_settings
+graphene_settings.SCHEMA.graphql_schema
+built = time.perf_counter()
+print(json.dumps({'setup': ready - started, 'schema': built - ready, 'total': built - started}))
+"""
+
+
+def generate(dataset):
+    """Fill the database with ``dataset``, bypassing signals, and return the row counts."""
+    rng = random.Random(dataset.seed)
+    now = timezone.now()
+
+    customers = Customer.objects.bulk_create([
+        Customer(
+            name=f"Customer {i}",
+            email=f"customer{i}@example.com",
+            phone=f"+1{rng.randrange(10 ** 9, 10 ** 10)}" if rng.random() < 0.7 else None,
+        )
+        for i in range(dataset.customers)
+    ], batch_size=BATCH_SIZE)
+    products = Product.objects.bulk_create([
+        Product(
+            name=f"Product {i}",
+            price=Decimal(rng.randrange(100, 50000)) / 100,
+            stock=rng.randrange(0, 100),
+        )
+        for i in range(dataset.products)
+    ], batch_size=BATCH_SIZE)
+
+    orders = Order.objects.bulk_create([
+        Order(customer=rng.choice(customers)) for _ in range(dataset.orders)
+    ], batch_size=BATCH_SIZE)
+    # order_date is auto_now_add, so it is spread over the year afterwards
+    for order in orders:
+        order.order_date = now - timedelta(days=rng.uniform(0, ORDER_DAYS))
+    Order.objects.bulk_update(orders, ['order_date'], batch_size=BATCH_SIZE)
+
+    items = []
+    for order in orders:
+        for product in rng.sample(products, rng.randint(1, min(dataset.items_per_order, len(products)))):
+            items.append(OrderItem(order=order, product=product, quantity=rng.randint(1, 3), unit_price=product.price))
+    OrderItem.objects.bulk_create(items, batch_size=BATCH_SIZE)
+
+    order_items.update_totals(Order.objects.values('pk'))
+    stats.rebuild()
+    for model in search.SEARCH_FIELDS:
+        search.rebuild(model)
+    response_cache.invalidate(Customer, Product, Order)
+    return {'customers': len(customers), 'products': len(products), 'orders': len(orders), 'items': len(items)}
+
+
+@contextlib.contextmanager
+def rolled_back():
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def http_scenario(name, query, variables=None, mutates=False):
+    """Scenario posting ``query`` to /graphql/; ``variables`` may be a function of the iteration."""
+    client = Client()
+
+    def run(iteration):
+        values = variables(iteration) if callable(variables) else variables
+        body = json.dumps({'query': query, 'variables': values or {}})
+        response = client.post('/graphql/', body, content_type='application/json')
+        result = response.json()
+        if response.status_code != 200 or result.get('errors'):
+            raise RuntimeError(f"{name}: {result.get('errors')}")
+
+    return Scenario(name, run, mutates)
+
+
+# Log files the cron jobs append to; benchmarked runs write to os.devnull
+CRON_LOGS = [
+    'crm.cron.HEARTBEAT_LOG',
+    'crm.cron.LOW_STOCK_LOG',
+    'crm.cron.CUSTOMER_CLEANUP_LOG',
+    'crm.cron_jobs.send_order_reminders.ORDER_REMINDERS_LOG',
+]
+
+
+def call_scenario(name, func, *args, mutates=True):
+    def run(iteration):
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+            for log in CRON_LOGS:
+                stack.enter_context(mock.patch(log, os.devnull))
+            func(*args)
+
+    return Scenario(name, run, mutates)
+
+
+def filter_samples(now):
+    """One value per argument of each filterset, as GraphQL variables."""
+    recent = (now - timedelta(days=30)).isoformat()
+    year_ago = (now - timedelta(days=ORDER_DAYS)).isoformat()
+    dates = {'gte': recent, 'lte': year_ago}
+    return {
+        CustomerFilter: {
+            'name': 'Customer 12', 'email': 'customer12', 'phone': '+15', 'phone_pattern': '+15',
+            'search': 'customer 7', 'order_by': '-lifetime_value',
+            'created_at': dates, 'order_count': {'gte': 8, 'lte': 2},
+            'lifetime_value': {'gte': 2000, 'lte': 500}, 'last_order_date': dates,
+        },
+        ProductFilter: {
+            'name': 'Product 1', 'search': 'product 3', 'low_stock': True,
+            'price': {'gte': 400, 'lte': 50}, 'stock': {'gte': 90, 'lte': 5},
+        },
+        OrderFilter: {
+            'search': 'customer 7', 'customer_name': 'Customer 12', 'product_name': 'Product 1',
+            'product_id': 1, 'total_amount': {'gte': 1000, 'lte': 100}, 'order_date': dates,
+        },
+    }
+
+
+def _sample(samples, name):
+    """Look up the sample of filter ``name`` (``price_gte``, ``price__gte`` or ``price``)."""
+    field, _, lookup = name.replace('__', '_').rpartition('_')
+    if name in samples and not isinstance(samples[name], dict):
+        return samples[name]
+    if field in samples and isinstance(samples[field], dict):
+        return samples[field][lookup]
+    return samples[name.split('__')[0]]
+
+
+def filter_scenarios(schema, now):
+    """One scenario per filter argument of each connection."""
+    connections = {
+        'allCustomers': (CustomerFilter, 'id name email'),
+        'allProducts': (ProductFilter, 'id name price stock'),
+        'allOrders': (OrderFilter, 'id totalAmount customer { email }'),
+    }
+    samples = filter_samples(now)
+    query_type = schema.graphql_schema.query_type
+    scenarios = []
+    for field, (filterset, selection) in connections.items():
+        for name in filterset.base_filters:
+            arg = to_camel_case(name)
+            arg_type = query_type.fields[field].args[arg].type
+            query = f'query($v: {arg_type}) {{ {field}(first: 20, {arg}: $v) {{ edges {{ node {{ {selection} }} }} }} }}'
+            value = _sample(samples[filterset], name)
+            scenarios.append(http_scenario(f'filter.{field}.{arg}', query, {'v': value}))
+    return scenarios
+
+
+def build_scenarios():
+    """Every benchmark scenario, against the data currently in the database."""
+    now = timezone.now()
+    recent = (now - timedelta(days=7)).isoformat()
+    customer = Customer.objects.order_by('pk').first()
+    in_stock = list(Product.objects.filter(stock__gte=1).order_by('pk').values_list('pk', flat=True)[:3])
+
+    scenarios = [
+        http_scenario('root.hello', '{ hello }'),
+        http_scenario('root.customers', '{ customers { id name email orderCount lifetimeValue } }'),
+        http_scenario('root.products', '{ products { id name price stock } }'),
+        http_scenario('root.orders', '{ orders { id totalAmount orderDate customer { email } products { name } } }'),
+        http_scenario(
+            'root.orders.recent',
+            'query($d: DateTime) { orders(orderDateGte: $d) { id customer { email } } }',
+            {'d': recent},
+        ),
+    ]
+    for group_by in ('DAY', 'WEEK', 'MONTH', 'CUSTOMER', 'PRODUCT'):
+        scenarios.append(http_scenario(
+            f'root.orderStats.{group_by.lower()}',
+            f'{{ orderStats(groupBy: {group_by}) {{ key orderCount revenue averageOrderValue }} }}',
+        ))
+
+    scenarios += [
+        http_scenario('root.allCustomers', '{ allCustomers(first: 50) { edges { node { id name orderCount } } } }'),
+        http_scenario('root.allProducts', '{ allProducts(first: 50) { edges { node { id name price } } } }'),
+        http_scenario(
+            'root.allOrders',
+            '{ allOrders(first: 50) { totalCount edges { node { id totalAmount customer { email } '
+            'products { name } } } } }',
+        ),
+    ]
+    scenarios += filter_scenarios(graphene_settings.SCHEMA, now)
+
+    scenarios += [
+        http_scenario(
+            'mutation.createCustomer',
+            'mutation($i: CustomerInput!) { createCustomer(input: $i) { customer { id } } }',
+            lambda i: {'i': {'name': f"Bench {i}", 'email': f"bench{i}@example.com"}}, mutates=True,
+        ),
+        http_scenario(
+            'mutation.bulkCreateCustomers',
+            'mutation($i: [CustomerInput]!) { bulkCreateCustomers(input: $i) { customers { id } errors } }',
+            lambda i: {'i': [{'name': f"Bulk {n}", 'email': f"bulk{i}-{n}@example.com"} for n in range(50)]},
+            mutates=True,
+        ),
+        http_scenario(
+            'mutation.createProduct',
+            'mutation { createProduct(input: {name: "Bench", price: "9.99", stock: 3}) { product { id } } }',
+            mutates=True,
+        ),
+        http_scenario(
+            'mutation.createOrder',
+            'mutation($i: OrderInput!) { createOrder(input: $i) { order { id totalAmount } } }',
+            {'i': {'customerId': customer.pk, 'productIds': in_stock}}, mutates=True,
+        ),
+        http_scenario(
+            'mutation.updateLowStockProducts', 'mutation { updateLowStockProducts { success } }', mutates=True,
+        ),
+    ]
+
+    scenarios += [
+        call_scenario('cron.log_crm_heartbeat', import_string('crm.cron.log_crm_heartbeat')),
+        call_scenario('cron.update_low_stock', import_string('crm.cron.update_low_stock')),
+        call_scenario(
+            'cron.send_order_reminders',
+            import_string('crm.cron_jobs.send_order_reminders.send_order_reminders'),
+        ),
+        call_scenario(
+            'cron.clean_inactive_customers',
+            import_string('django.core.management.call_command'), 'clean_inactive_customers', '--days', '90',
+        ),
+    ]
+    return scenarios
+
+
+def run_scenario(scenario, iterations=20, warmup=2):
+    """Time ``iterations`` runs of ``scenario`` and return its statistics.
+
+    The first warmup run is also the one whose SQL queries are counted.
+    """
+    def once(iteration):
+        if scenario.mutates:
+            with rolled_back():
+                scenario.run(iteration)
+        else:
+            scenario.run(iteration)
+
+    # Row counts are cached across requests; count them up front so they
+    # are not credited to the scenario
+    complexity.row_counts()
+    # The query log is bounded, and cleared by the next request; count
+    # the queries while they are there
+    reset_queries()
+    with CaptureQueriesContext(transaction.get_connection()) as ctx:
+        once(0)
+    queries = len(ctx.captured_queries)
+    for iteration in range(1, warmup):
+        once(iteration)
+
+    timings = []
+    for iteration in range(warmup, warmup + iterations):
+        started = time.perf_counter()
+        once(iteration)
+        timings.append(time.perf_counter() - started)
+
+    ordered = sorted(timings)
+    return {
+        'iterations': iterations,
+        'ops_per_sec': round(iterations / sum(timings), 2),
+        'p50_ms': round(statistics.median(ordered) * 1000, 3),
+        'p99_ms': round(ordered[min(int(0.99 * len(ordered)), len(ordered) - 1)] * 1000, 3),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'queries': queries,
+    }
+
+
+def startup(runs=5):
+    """Median milliseconds of ``django.setup()`` and of the schema build, over ``runs`` fresh interpreters."""
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT, os.environ['DJANGO_SETTINGS_MODULE']],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout
+        samples.append(json.loads(output))
+    return {
+        f'{phase}_ms': round(statistics.median(sample[phase] for sample in samples) * 1000, 3)
+        for phase in ('setup', 'schema', 'total')
+    }
+
+
+def concurrency(statements, reconnect=False, readers=4, writers=2, seconds=2.0, rows=1000):
+    """Reads and writes per second of threads sharing a scratch SQLite file.
+
+    Every thread has its own connection, set up with the PRAGMA
+    ``statements``; with ``reconnect`` it opens a new one per operation, as
+    a request does when ``CONN_MAX_AGE`` is 0. Writers update one row per
+    autocommit transaction, as a mutation does; readers sum a range of
+    rows. Statements failing with "database is locked" count as errors.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'concurrency.sqlite3')
+
+        def connect():
+            conn = sqlite3.connect(path, isolation_level=None)
+            database.apply(conn, statements)
+            return conn
+
+        setup = connect()
+        setup.execute('CREATE TABLE product (id INTEGER PRIMARY KEY, stock INTEGER NOT NULL)')
+        setup.execute('BEGIN')
+        setup.executemany('INSERT INTO product (stock) VALUES (?)', [(0,)] * rows)
+        setup.execute('COMMIT')
+        setup.close()
+
+        totals = {'reads': 0, 'writes': 0, 'errors': 0}
+        lock = threading.Lock()
+        start = threading.Barrier(readers + writers)
+
+        def work(kind, seed):
+            rng = random.Random(seed)
+            conn = None if reconnect else connect()
+            done = failed = 0
+            start.wait()
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                first = rng.randrange(1, rows + 1)
+                if reconnect:
+                    conn = connect()
+                try:
+                    if kind == 'writes':
+                        conn.execute('UPDATE product SET stock = stock + 1 WHERE id = ?', (first,))
+                    else:
+                        conn.execute('SELECT SUM(stock) FROM product WHERE id BETWEEN ? AND ?', (first, first + 100))
+                    done += 1
+                except sqlite3.OperationalError:
+                    failed += 1
+                if reconnect:
+                    conn.close()
+            if not reconnect:
+                conn.close()
+            with lock:
+                totals[kind] += done
+                totals['errors'] += failed
+
+        threads = [threading.Thread(target=work, args=('reads', i)) for i in range(readers)]
+        threads += [threading.Thread(target=work, args=('writes', readers + i)) for i in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    return {
+        'reads_per_sec': round(totals['reads'] / seconds, 1),
+        'writes_per_sec': round(totals['writes'] / seconds, 1),
+        'errors': totals['errors'],
+    }
+
+
+def compare_tuning(seconds=2.0):
+    """Concurrent throughput with Django's and SQLite's defaults, and with the configured tuning.
+
+    The defaults open a connection per operation. The tuned run keeps its
+    connections, as the WSGI deployment does with ``CRM_CONN_MAX_AGE``;
+    ``tuned_asgi`` opens one per operation, as the ASGI deployment does
+    with persistent connections off.
+    """
+    return {
+        'default': concurrency([], reconnect=True, seconds=seconds),
+        'tuned': concurrency(database.pragmas(), seconds=seconds),
+        'tuned_asgi': concurrency(database.pragmas(), reconnect=True, seconds=seconds),
+    }
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'machine': platform.machine(),
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return a message for each scenario that regressed against ``baseline``.
+
+    A scenario regresses when its p50 latency grows by more than
+    ``threshold`` or when it runs more SQL queries than before; startup
+    regresses when any of its phases grows by more than ``threshold``, so a
+    slower schema build is caught even while ``django.setup()`` dominates
+    the total.
+    """
+    regressions = []
+    current, previous = results.get('startup') or {}, baseline.get('startup') or {}
+    for phase in ('setup_ms', 'schema_ms', 'total_ms'):
+        if phase in current and phase in previous and current[phase] > previous[phase] * (1 + threshold):
+            regressions.append(
+                f"startup: {phase} {previous[phase]}ms -> {current[phase]}ms "
+                f"(+{current[phase] / previous[phase] - 1:.0%})"
+            )
+    for mode in ('tuned', 'tuned_asgi'):
+        current = results.get('concurrency', {}).get(mode)
+        previous = baseline.get('concurrency', {}).get(mode)
+        for key in ('reads_per_sec', 'writes_per_sec') if current and previous else ():
+            if current[key] < previous[key] * (1 - threshold):
+                name = 'concurrency' if mode == 'tuned' else f'concurrency ({mode})'
+                regressions.append(f"{name}: {key} {previous[key]} -> {current[key]}")
+    for name, current in sorted(results['scenarios'].items()):
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        if current['p50_ms'] > previous['p50_ms'] * (1 + threshold):
+            regressions.append(
+                f"{name}: p50 {previous['p50_ms']}ms -> {current['p50_ms']}ms "
+                f"(+{current['p50_ms'] / previous['p50_ms'] - 1:.0%})"
+            )
+        if current['queries'] > previous['queries']:
+            regressions.append(f"{name}: {previous['queries']} -> {current['queries']} queries")
+    return regressions
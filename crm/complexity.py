@@ -0,0 +1,210 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from graphene import relay
+from graphene_django.settings import graphene_settings
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLInt,
+    get_named_type,
+    get_operation_ast,
+    is_list_type,
+    is_composite_type,
+    value_from_ast,
+)
+
+DEFAULTS = {
+    # Operations costing more than this are rejected before execution
+    'MAX_COST': 50000,
+    'MAX_DEPTH': 12,
+    # Assumed length of a list field that takes no first/last argument
+    'DEFAULT_LIST_SIZE': 100,
+    # Root lists returning every row of a model are costed at its row count,
+    # counted at most once per ROW_COUNT_TIMEOUT seconds
+    'ROW_COUNTS': {
+        'Query.customers': 'crm.Customer',
+        'Query.products': 'crm.Product',
+        'Query.orders': 'crm.Order',
+    },
+    'ROW_COUNT_TIMEOUT': 60,
+    # Per "Type.field" overrides of that assumption
+    'LIST_SIZES': {
+        'OrderType.products': 10,
+        'CustomerType.orderSet': 20,
+        'ProductType.orderSet': 100,
+    },
+    # Cost of resolving a field once, before its children; composite fields
+    # default to 1 and scalars to 0. The M2M lookups cost more than a join.
+    'FIELD_COSTS': {
+        'OrderType.products': 2,
+        'CustomerType.orderSet': 2,
+        'ProductType.orderSet': 2,
+    },
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'GRAPHQL_QUERY_COST', {}).get(name, DEFAULTS[name])
+
+
+def _row_count_key(label):
+    return f'crm:complexity:rows:{label.lower()}'
+
+
+def _cached_row_counts():
+    labels = set(get_setting('ROW_COUNTS').values())
+    return {label: cache.get(_row_count_key(label)) for label in labels}
+
+
+def _store_row_count(label, count):
+    cache.set(_row_count_key(label), count, get_setting('ROW_COUNT_TIMEOUT'))
+    return count
+
+
+def row_count(label):
+    """Return the number of rows of model ``label`` (``app.Model``), cached for ``ROW_COUNT_TIMEOUT``."""
+    count = cache.get(_row_count_key(label))
+    if count is None:
+        count = _store_row_count(label, apps.get_model(label)._default_manager.count())
+    return count
+
+
+def row_counts():
+    """Return ``{label: rows}`` of every ``ROW_COUNTS`` model, counting those not cached."""
+    return {
+        label: row_count(label) if count is None else count
+        for label, count in _cached_row_counts().items()
+    }
+
+
+async def arow_counts():
+    """``row_counts`` through the async ORM."""
+    counts = _cached_row_counts()
+    for label, count in counts.items():
+        if count is None:
+            counts[label] = _store_row_count(label, await apps.get_model(label)._default_manager.acount())
+    return counts
+
+
+class CostAnalyzer:
+    """Estimates the cost and depth of an operation from its selection set.
+
+    A field costs its own ``FIELD_COSTS`` entry plus the cost of its children
+    times the number of items it returns: ``first``/``last`` for connections
+    (or the relay max limit), the row count of the model for ``ROW_COUNTS``
+    root lists, ``LIST_SIZES``/``DEFAULT_LIST_SIZE`` for other plain lists,
+    and 1 otherwise. Introspection fields are free.
+
+    ``row_counts`` maps model labels to row counts already known; others
+    are read through ``row_count``.
+    """
+
+    def __init__(self, schema, document, variables=None, row_counts=None):
+        self.schema = schema.graphql_schema
+        self.variables = variables or {}
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        self.list_sizes = get_setting('LIST_SIZES')
+        self.field_costs = get_setting('FIELD_COSTS')
+        self.default_list_size = get_setting('DEFAULT_LIST_SIZE')
+        self.row_count_models = get_setting('ROW_COUNTS')
+        self.row_counts = dict(row_counts or {})
+
+    def analyze(self, operation):
+        """Return ``(cost, depth)`` for ``operation``."""
+        root = self.schema.get_root_type(operation.operation)
+        return self.selection_cost(root, operation.selection_set)
+
+    def selection_cost(self, parent_type, selection_set):
+        cost = depth = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                field_cost, field_depth = self.field_cost(parent_type, selection)
+            else:
+                if isinstance(selection, FragmentSpreadNode):
+                    fragment = self.fragments[selection.name.value]
+                else:
+                    fragment = selection
+                fragment_type = parent_type
+                if fragment.type_condition is not None:
+                    fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+                field_cost, field_depth = self.selection_cost(fragment_type, fragment.selection_set)
+            cost += field_cost
+            depth = max(depth, field_depth)
+        return cost, depth
+
+    def field_cost(self, parent_type, node):
+        name = node.name.value
+        if name.startswith('__'):
+            return 0, 0
+        field = parent_type.fields[name]
+        named_type = get_named_type(field.type)
+        key = f'{parent_type.name}.{name}'
+        own_cost = self.field_costs.get(key, 1 if is_composite_type(named_type) else 0)
+        if node.selection_set is None:
+            return own_cost, 0
+
+        children_cost, children_depth = self.selection_cost(named_type, node.selection_set)
+        return own_cost + self.multiplier(parent_type, field, node, key) * children_cost, children_depth + 1
+
+    def multiplier(self, parent_type, field, node, key):
+        if 'first' in field.args or 'last' in field.args:
+            size = None
+            for argument in node.arguments:
+                if argument.name.value in ('first', 'last'):
+                    size = max(size or 0, value_from_ast(argument.value, GraphQLInt, self.variables) or 0)
+            if size is None:
+                size = graphene_settings.RELAY_CONNECTION_MAX_LIMIT or self.default_list_size
+            return size
+        unwrapped = getattr(field.type, 'of_type', field.type)
+        if not (is_list_type(field.type) or is_list_type(unwrapped)):
+            return 1
+        graphene_type = getattr(parent_type, 'graphene_type', None)
+        if isinstance(graphene_type, type) and issubclass(graphene_type, relay.Connection):
+            # A connection's edges are already counted by its first/last
+            return 1
+        if key in self.row_count_models:
+            label = self.row_count_models[key]
+            if label not in self.row_counts:
+                self.row_counts[label] = row_count(label)
+            return self.row_counts[label]
+        return self.list_sizes.get(key, self.default_list_size)
+
+
+def analyze(schema, document, operation_name=None, variables=None, row_counts=None):
+    """Return ``(cost, depth)`` of the operation that will run, or ``(0, 0)``."""
+    operation = get_operation_ast(document, operation_name)
+    if operation is None:
+        return 0, 0
+    return CostAnalyzer(schema, document, variables, row_counts).analyze(operation)
+
+
+def check(schema, document, operation_name=None, variables=None, row_counts=None):
+    """Return ``(extensions, errors)`` for an operation about to be executed.
+
+    ``errors`` is non-empty when the operation exceeds ``MAX_COST`` or
+    ``MAX_DEPTH``; ``extensions`` reports the cost either way.
+    """
+    cost, depth = analyze(schema, document, operation_name, variables, row_counts)
+    max_cost = get_setting('MAX_COST')
+    max_depth = get_setting('MAX_DEPTH')
+    extensions = {'cost': {'requested': cost, 'maximum': max_cost, 'depth': depth, 'maxDepth': max_depth}}
+
+    errors = []
+    if max_cost is not None and cost > max_cost:
+        errors.append(GraphQLError(
+            f"Query cost {cost} exceeds the maximum cost of {max_cost}",
+            extensions={'code': 'QUERY_TOO_COMPLEX', **extensions['cost']},
+        ))
+    if max_depth is not None and depth > max_depth:
+        errors.append(GraphQLError(
+            f"Query depth {depth} exceeds the maximum depth of {max_depth}",
+            extensions={'code': 'QUERY_TOO_DEEP', **extensions['cost']},
+        ))
+    return extensions, errors
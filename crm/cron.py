@@ -1,15 +1,21 @@
+import io
 import os
 import sys
 import django
 from datetime import datetime
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
 
 # Setup Django environment
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx-backend-graphql_crm.settings')
 django.setup()
 
+from django.core.management import call_command
+
 from crm.models import Product
+from crm import graphql_client
+
+HEARTBEAT_LOG = '/tmp/crm_heartbeat_log.txt'
+LOW_STOCK_LOG = '/tmp/low_stock_updates_log.txt'
+CUSTOMER_CLEANUP_LOG = '/tmp/customer_cleanup_log.txt'
 
 def log_crm_heartbeat():
     """Log a heartbeat message every 5 minutes to confirm CRM health."""
@@ -19,16 +25,13 @@ def log_crm_heartbeat():
     
     try:
         # Optionally query GraphQL hello field to verify endpoint is responsive
-        transport = RequestsHTTPTransport(url="http://localhost:8000/graphql")
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-        
-        query = gql("""
+        query = """
             query {
                 hello
             }
-        """)
+        """
         
-        result = client.execute(query)
+        result = graphql_client.execute(query)
         if result.get('hello'):
             heartbeat_msg += " - GraphQL endpoint responsive"
         
@@ -36,19 +39,15 @@ def log_crm_heartbeat():
         heartbeat_msg += f" - GraphQL endpoint error: {str(e)}"
     
     # Append to log file
-    with open('/tmp/crm_heartbeat_log.txt', 'a') as log_file:
+    with open(HEARTBEAT_LOG, 'a') as log_file:
         log_file.write(heartbeat_msg + '\n')
 
 def update_low_stock():
     """Execute UpdateLowStockProducts mutation and log updates."""
     
     try:
-        # Setup GraphQL client
-        transport = RequestsHTTPTransport(url="http://localhost:8000/graphql")
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-        
         # Execute the mutation
-        mutation = gql("""
+        mutation = """
             mutation {
                 updateLowStockProducts {
                     success
@@ -60,9 +59,9 @@ def update_low_stock():
                     }
                 }
             }
-        """)
+        """
         
-        result = client.execute(mutation)
+        result = graphql_client.execute(mutation)
         
         # Log the results
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -79,7 +78,7 @@ def update_low_stock():
             log_entries.append(f"Failed: {mutation_result.get('message', 'Unknown error')}")
         
         # Write to log file
-        with open('/tmp/low_stock_updates_log.txt', 'a') as log_file:
+        with open(LOW_STOCK_LOG, 'a') as log_file:
             for entry in log_entries:
                 log_file.write(entry + '\n')
                 
@@ -87,5 +86,20 @@ def update_low_stock():
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         error_msg = f"[{timestamp}] Error updating low stock products: {str(e)}"
         
-        with open('/tmp/low_stock_updates_log.txt', 'a') as log_file:
+        with open(LOW_STOCK_LOG, 'a') as log_file:
             log_file.write(error_msg + '\n')
+
+def clean_inactive_customers():
+    """Delete customers with no orders in the last year and log the summary."""
+
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    output = io.StringIO()
+    try:
+        # Deletes in chunks; prints a one-line summary
+        call_command('clean_inactive_customers', days=365, stdout=output)
+        summary = output.getvalue().strip()
+    except Exception as e:
+        summary = f"Error cleaning inactive customers: {str(e)}"
+
+    with open(CUSTOMER_CLEANUP_LOG, 'a') as log_file:
+        log_file.write(f"[{timestamp}] {summary}\n")
@@ -4,8 +4,6 @@ import os
 import sys
 import django
 from datetime import datetime, timedelta
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
 
 # Add the project directory to Python path
 project_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -15,20 +13,22 @@ sys.path.append(project_dir)
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx-backend-graphql_crm.settings')
 django.setup()
 
+from django.utils import timezone
+
+from crm import graphql_client
+
+ORDER_REMINDERS_LOG = '/tmp/order_reminders_log.txt'
+
 def send_order_reminders():
     """Query GraphQL endpoint for pending orders and log reminders."""
     
-    # GraphQL endpoint URL
-    transport = RequestsHTTPTransport(url="http://localhost:8000/graphql")
-    client = Client(transport=transport, fetch_schema_from_transport=True)
-    
     # Calculate date 7 days ago
-    seven_days_ago = datetime.now() - timedelta(days=7)
+    seven_days_ago = timezone.now() - timedelta(days=7)
     
     # GraphQL query for orders within the last 7 days
-    query = gql("""
+    query = """
         query GetRecentOrders($startDate: DateTime!) {
-            orders(orderDate_Gte: $startDate) {
+            orders(orderDateGte: $startDate) {
                 id
                 orderDate
                 customer {
@@ -36,11 +36,11 @@ def send_order_reminders():
                 }
             }
         }
-    """)
+    """
     
     try:
         # Execute the query
-        result = client.execute(query, variable_values={"startDate": seven_days_ago.isoformat()})
+        result = graphql_client.execute(query, {"startDate": seven_days_ago.isoformat()})
         
         # Log each order
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -53,7 +53,7 @@ def send_order_reminders():
             log_entries.append(log_entry)
         
         # Write to log file
-        with open('/tmp/order_reminders_log.txt', 'a') as log_file:
+        with open(ORDER_REMINDERS_LOG, 'a') as log_file:
             for entry in log_entries:
                 log_file.write(entry + '\n')
         
@@ -64,7 +64,7 @@ def send_order_reminders():
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         error_msg = f"[{timestamp}] Error processing order reminders: {str(e)}"
         
-        with open('/tmp/order_reminders_log.txt', 'a') as log_file:
+        with open(ORDER_REMINDERS_LOG, 'a') as log_file:
             log_file.write(error_msg + '\n')
         
         print(f"Error: {str(e)}")
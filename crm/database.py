@@ -0,0 +1,61 @@
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Readers no longer block the writer, or the writer the readers
+    'JOURNAL_MODE': 'WAL',
+    # In WAL mode, only sync at checkpoints; a power loss can drop the last
+    # commits but never corrupts the database
+    'SYNCHRONOUS': 'NORMAL',
+    # Bytes of the file read through a memory map instead of read() calls
+    'MMAP_SIZE': 256 * 1024 * 1024,
+    # Page cache per connection; negative values are KiB
+    'CACHE_SIZE': -64 * 1024,
+    # Milliseconds to wait for a lock before "database is locked"
+    'BUSY_TIMEOUT': 5000,
+}
+
+# Setting -> PRAGMA, in the order they are applied: the busy timeout
+# first, so switching the journal mode waits for other connections
+PRAGMAS = {
+    'BUSY_TIMEOUT': 'busy_timeout',
+    'JOURNAL_MODE': 'journal_mode',
+    'SYNCHRONOUS': 'synchronous',
+    'MMAP_SIZE': 'mmap_size',
+    'CACHE_SIZE': 'cache_size',
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'SQLITE_TUNING', {}).get(name, DEFAULTS[name])
+
+
+def pragmas():
+    """Return the ``PRAGMA`` statements for the configured tuning; settings set to None are skipped."""
+    if not get_setting('ENABLED'):
+        return []
+    statements = []
+    for name, pragma in PRAGMAS.items():
+        value = get_setting(name)
+        if value is None:
+            continue
+        if not isinstance(value, int) and not str(value).isalpha():
+            raise ValueError(f"SQLITE_TUNING[{name!r}] must be an integer or a keyword, not {value!r}")
+        statements.append(f'PRAGMA {pragma} = {value}')
+    return statements
+
+
+def apply(raw_connection, statements=None):
+    """Run the tuning ``PRAGMA`` statements on a DB-API sqlite3 connection."""
+    for statement in pragmas() if statements is None else statements:
+        raw_connection.execute(statement)
+
+
+def tune(connection):
+    """Tune a new Django connection, if it is to SQLite.
+
+    The PRAGMAs run on the underlying sqlite3 connection, so they are not
+    counted as queries of the request that opened it.
+    """
+    if connection.vendor == 'sqlite':
+        apply(connection.connection)
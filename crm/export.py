@@ -0,0 +1,108 @@
+import csv
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Order, OrderItem
+
+# ``items`` holds one ``[product_id, quantity, unit_price]`` per order line,
+# so an order can be reconciled with its total_amount
+EXPORT_FIELDS = ('id', 'order_date', 'total_amount', 'customer_id', 'customer_email', 'items')
+
+# Orders per fetch, and per order-line lookup
+CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_chunks(queryset=None, chunk_size=CHUNK_SIZE):
+    """Yield the rows of ``queryset`` as lists of dicts, ``chunk_size`` orders at a time.
+
+    Orders are read with ``iterator()`` (a server-side cursor where the
+    database supports one) with the customer email joined in, and the
+    lines of each chunk come from one ``OrderItem`` query, so memory stays
+    bounded by the chunk size however many orders are exported.
+    """
+    if queryset is None:
+        queryset = Order.objects.all()
+    rows = queryset.order_by('pk').values_list(
+        'id', 'order_date', 'total_amount', 'customer_id', 'customer__email'
+    ).iterator(chunk_size=chunk_size)
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield _with_items(chunk)
+            chunk = []
+    if chunk:
+        yield _with_items(chunk)
+
+
+def _with_items(chunk):
+    items = {row[0]: [] for row in chunk}
+    lines = OrderItem.objects.filter(order_id__in=list(items)).order_by('pk')
+    for order_id, product_id, quantity, unit_price in lines.values_list(
+        'order_id', 'product_id', 'quantity', 'unit_price'
+    ):
+        items[order_id].append([product_id, quantity, unit_price])
+    return [dict(zip(EXPORT_FIELDS, row + (items[row[0]],))) for row in chunk]
+
+
+def render_ndjson(chunks):
+    for rows in chunks:
+        yield ''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows)
+
+
+class _Echo:
+    """File-like object handing back what csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(chunks):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for rows in chunks:
+        yield ''.join(
+            writer.writerow([
+                row['id'],
+                row['order_date'].isoformat(),
+                row['total_amount'],
+                row['customer_id'],
+                row['customer_email'],
+                # product_id:quantity:unit_price per line
+                ' '.join(':'.join(map(str, item)) for item in row['items']),
+            ])
+            for row in rows
+        )
+
+
+RENDERERS = {
+    'ndjson': render_ndjson,
+    'csv': render_csv,
+}
+
+
+def render(queryset=None, format='ndjson', chunk_size=CHUNK_SIZE):
+    """Return an iterator of text blocks, one per chunk, for ``format``."""
+    return RENDERERS[format](export_chunks(queryset, chunk_size))
+
+
+async def arender(queryset=None, format='ndjson', chunk_size=CHUNK_SIZE):
+    """``render`` as an async iterator.
+
+    Under ASGI, Django buffers a streaming response built from a sync
+    iterator in memory; this one fetches each chunk off the event loop,
+    so the response streams as it does under WSGI.
+    """
+    blocks = render(queryset, format, chunk_size)
+    next_block = sync_to_async(next)
+    done = object()
+    while (block := await next_block(blocks, done)) is not done:
+        yield block
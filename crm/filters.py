@@ -1,24 +1,61 @@
 import django_filters
-from .models import Customer, Product, Order
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from .models import Customer, CustomerStats, Product, Order
+from . import search, stats
 
-class CustomerFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(lookup_expr='icontains')
-    email = django_filters.CharFilter(lookup_expr='icontains')
+class SearchFilterSet(django_filters.FilterSet):
+    """Text filters resolved through the search index (see crm/search.py)."""
+    search = django_filters.CharFilter(method='filter_search')
+
+    def filter_text(self, queryset, name, value):
+        # Same results as icontains on `name`, without a LIKE '%x%' scan
+        return search.filter_text(queryset, value, [name])
+
+    def filter_search(self, queryset, name, value):
+        return search.search(queryset, value)
+
+class CustomerFilter(SearchFilterSet):
+    name = django_filters.CharFilter(field_name='name', method='filter_text')
+    email = django_filters.CharFilter(field_name='email', method='filter_text')
+    # name_Icontains/email_Icontains are kept for existing clients, on the index
+    name__icontains = django_filters.CharFilter(field_name='name', method='filter_text')
+    email__icontains = django_filters.CharFilter(field_name='email', method='filter_text')
     created_at_gte = django_filters.DateTimeFilter(field_name='created_at', lookup_expr='gte')
     created_at_lte = django_filters.DateTimeFilter(field_name='created_at', lookup_expr='lte')
     phone_pattern = django_filters.CharFilter(field_name='phone', lookup_expr='startswith')
+    # Read from crm_customerstats (see crm/stats.py) instead of aggregating orders
+    order_count_gte = django_filters.NumberFilter(field_name='stats__order_count', lookup_expr='gte')
+    order_count_lte = django_filters.NumberFilter(field_name='stats__order_count', lookup_expr='lte')
+    lifetime_value_gte = django_filters.NumberFilter(field_name='stats__lifetime_value', lookup_expr='gte')
+    lifetime_value_lte = django_filters.NumberFilter(field_name='stats__lifetime_value', lookup_expr='lte')
+    last_order_date_gte = django_filters.DateTimeFilter(field_name='stats__last_order_date', lookup_expr='gte')
+    last_order_date_lte = django_filters.DateTimeFilter(field_name='stats__last_order_date', lookup_expr='lte')
+    order_by = django_filters.ChoiceFilter(
+        method='filter_order_by',
+        choices=[(f'{sign}{field}', f'{sign}{field}') for field in stats.SORT_DEFAULTS for sign in ('', '-')],
+    )
+
+    def filter_order_by(self, queryset, name, value):
+        # Sorted on an annotation, which KeysetConnectionField pages on
+        field = value.lstrip('-')
+        sort_value = Coalesce(
+            F(f'stats__{field}'),
+            Value(stats.SORT_DEFAULTS[field]),
+            output_field=CustomerStats._meta.get_field(field),
+        )
+        return queryset.annotate(sort_value=sort_value).order_by(value.replace(field, 'sort_value'))
     
     class Meta:
         model = Customer
         fields = {
-            'name': ['icontains'],
-            'email': ['icontains'],
             'created_at': ['gte', 'lte'],
             'phone': ['startswith'],
         }
 
-class ProductFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(lookup_expr='icontains')
+class ProductFilter(SearchFilterSet):
+    name = django_filters.CharFilter(field_name='name', method='filter_text')
+    name__icontains = django_filters.CharFilter(field_name='name', method='filter_text')
     price_gte = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
     price_lte = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
     stock_gte = django_filters.NumberFilter(field_name='stock', lookup_expr='gte')
@@ -33,20 +70,37 @@ class ProductFilter(django_filters.FilterSet):
     class Meta:
         model = Product
         fields = {
-            'name': ['icontains'],
             'price': ['gte', 'lte'],
             'stock': ['gte', 'lte'],
         }
 
-class OrderFilter(django_filters.FilterSet):
+class OrderFilter(SearchFilterSet):
     total_amount_gte = django_filters.NumberFilter(field_name='total_amount', lookup_expr='gte')
     total_amount_lte = django_filters.NumberFilter(field_name='total_amount', lookup_expr='lte')
     order_date_gte = django_filters.DateTimeFilter(field_name='order_date', lookup_expr='gte')
     order_date_lte = django_filters.DateTimeFilter(field_name='order_date', lookup_expr='lte')
-    customer_name = django_filters.CharFilter(field_name='customer__name', lookup_expr='icontains')
-    product_name = django_filters.CharFilter(field_name='products__name', lookup_expr='icontains')
+    customer_name = django_filters.CharFilter(method='filter_customer_name')
+    product_name = django_filters.CharFilter(method='filter_product_name')
     product_id = django_filters.NumberFilter(field_name='products__id')
     
+    def filter_customer_name(self, queryset, name, value):
+        # Match customers first and probe orders through the
+        # (customer_id, order_date) index, instead of scanning every order
+        # and joining each one to its customer.
+        if value:
+            customers = search.filter_text(Customer.objects.all(), value, ['name'])
+            return queryset.filter(customer__in=customers.values('pk'))
+        return queryset
+
+    def filter_product_name(self, queryset, name, value):
+        # A subquery on the through table rather than a join, so an order
+        # with several matching products is returned once.
+        if value:
+            products = search.filter_text(Product.objects.all(), value, ['name'])
+            order_ids = Order.products.through.objects.filter(product__in=products.values('pk')).values('order_id')
+            return queryset.filter(pk__in=order_ids)
+        return queryset
+    
     class Meta:
         model = Order
         fields = {
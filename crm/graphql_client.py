@@ -0,0 +1,104 @@
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from gql import Client, gql
+from gql.transport import Transport
+from graphql import execute as execute_document
+
+DEFAULTS = {
+    # Execute against GRAPHENE['SCHEMA'] in this process instead of over HTTP
+    'IN_PROCESS': True,
+    'URL': 'http://localhost:8000/graphql/',
+    # SDL used to validate documents locally when going over HTTP; refresh
+    # with ``manage.py graphql_schema --out crm/schema.graphql``
+    'SCHEMA_PATH': Path(__file__).resolve().parent / 'schema.graphql',
+    'TIMEOUT': 10,
+    'RETRIES': 3,
+}
+
+_session = None
+_lock = threading.Lock()
+
+
+def get_setting(name):
+    return getattr(settings, 'GRAPHQL_CLIENT', {}).get(name, DEFAULTS[name])
+
+
+class InProcessTransport(Transport):
+    """gql transport executing documents against a graphene schema, without a network hop."""
+
+    def __init__(self, schema):
+        self.schema = schema
+
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    def execute(self, document, variable_values=None, operation_name=None, **kwargs):
+        return execute_document(
+            self.schema.graphql_schema,
+            document,
+            variable_values=variable_values,
+            operation_name=operation_name,
+            # A dict context gives the operation its own loaders
+            context_value={},
+        )
+
+
+def build_client():
+    """Return a gql Client for the configured transport, with a local schema.
+
+    The schema is never fetched by introspection: in-process clients use
+    the graphene schema itself and HTTP clients the SDL snapshot.
+    """
+    if get_setting('IN_PROCESS'):
+        from graphene_django.settings import graphene_settings
+
+        schema = graphene_settings.SCHEMA
+        return Client(schema=schema.graphql_schema, transport=InProcessTransport(schema))
+
+    # Needs gql[requests]
+    from gql.transport.requests import RequestsHTTPTransport
+
+    transport = RequestsHTTPTransport(
+        url=get_setting('URL'),
+        timeout=get_setting('TIMEOUT'),
+        retries=get_setting('RETRIES'),
+    )
+    return Client(schema=Path(get_setting('SCHEMA_PATH')).read_text(), transport=transport)
+
+
+def get_session():
+    """Return the process-wide client session, connecting it on first use.
+
+    Over HTTP the session holds one ``requests.Session``, so its connection
+    pool is reused by every job run in the process.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            _session = build_client().connect_sync()
+        return _session
+
+
+def close():
+    """Close the shared session; the next call to ``get_session`` reconnects."""
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.client.close_sync()
+            _session = None
+
+
+@lru_cache(maxsize=64)
+def document(query):
+    return gql(query)
+
+
+def execute(query, variables=None):
+    """Execute ``query`` and return its data; GraphQL errors raise ``TransportQueryError``."""
+    return get_session().execute(document(query), variable_values=variables)
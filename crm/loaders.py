@@ -0,0 +1,186 @@
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+
+from .models import Customer, Product, Order
+
+
+class DataLoader:
+    """Per-request batching cache for one kind of related lookup.
+
+    Keys queued with ``prime`` are fetched together the first time ``load``
+    misses the cache, so resolving the same field for every item of a list
+    costs one query instead of one query per item. An async loader returns
+    an awaitable on a miss and runs the batch off the event loop.
+    """
+
+    def __init__(self, batch_load_fn, default_factory=lambda: None, is_async=False):
+        self.batch_load_fn = batch_load_fn
+        self.default_factory = default_factory
+        self.is_async = is_async
+        self._cache = {}
+        self._queue = set()
+
+    def prime(self, keys):
+        self._queue.update(key for key in keys if key not in self._cache)
+
+    def load(self, key):
+        if key not in self._cache:
+            self._queue.add(key)
+            if self.is_async:
+                return self._aload(key)
+            self.dispatch()
+        return self._cache[key]
+
+    async def _aload(self, key):
+        # Sync-to-async calls run one at a time on the request's thread, so
+        # the first miss dispatches every queued key and later misses find
+        # theirs already cached.
+        if key not in self._cache:
+            await sync_to_async(self.dispatch)()
+        return self._cache[key]
+
+    def load_many(self, keys):
+        return [self.load(key) for key in keys]
+
+    def dispatch(self):
+        keys, self._queue = list(self._queue), set()
+        if not keys:
+            return
+        results = self.batch_load_fn(keys)
+        for key in keys:
+            self._cache[key] = results[key] if key in results else self.default_factory()
+
+
+class Loaders:
+    """The set of loaders shared by every resolver of a single request."""
+
+    def __init__(self, is_async=False):
+        self.is_async = is_async
+        self.customer = DataLoader(self._load_customers, is_async=is_async)
+        self.order_products = DataLoader(self._load_order_products, list, is_async)
+        self.customer_orders = DataLoader(self._load_customer_orders, list, is_async)
+        self.product_orders = DataLoader(self._load_product_orders, list, is_async)
+
+    def prime(self, instances):
+        """Queue the related keys of ``instances`` and return them as a list.
+
+        Priming a whole list before its items are resolved is what lets the
+        first nested lookup fetch the related rows for all siblings at once.
+        """
+        instances = list(instances)
+        for instance in instances:
+            if isinstance(instance, Order):
+                # Relations already joined or prefetched by the optimizer are
+                # primed in turn instead of being queued for a second fetch.
+                if Order.customer.is_cached(instance):
+                    self.prime([instance.customer])
+                else:
+                    self.customer.prime([instance.customer_id])
+                if _is_prefetched(instance, 'products'):
+                    self.prime(instance.products.all())
+                else:
+                    self.order_products.prime([instance.pk])
+            elif isinstance(instance, Customer):
+                self.customer_orders.prime([instance.pk])
+            elif isinstance(instance, Product):
+                self.product_orders.prime([instance.pk])
+        return instances
+
+    def resolve_list(self, queryset):
+        """Evaluate and prime ``queryset``; an awaitable for async loaders."""
+        if self.is_async:
+            return self._aresolve_list(queryset)
+        return self.prime(queryset)
+
+    async def _aresolve_list(self, queryset):
+        return self.prime(await alist(queryset))
+
+    def customer_of(self, order):
+        if Order.customer.is_cached(order):
+            return order.customer
+        return self.customer.load(order.customer_id)
+
+    def products_of(self, order):
+        if _is_prefetched(order, 'products'):
+            return list(order.products.all())
+        return self.order_products.load(order.pk)
+
+    def _load_customers(self, customer_ids):
+        customers = {c.pk: c for c in Customer.objects.filter(pk__in=customer_ids).select_related('stats')}
+        self.prime(customers.values())
+        return customers
+
+    def _load_order_products(self, order_ids):
+        through = Order.products.through
+        rows = through.objects.filter(order_id__in=order_ids).select_related('product').order_by('pk')
+        products = defaultdict(list)
+        for row in rows:
+            products[row.order_id].append(row.product)
+        self.prime(p for group in products.values() for p in group)
+        return products
+
+    def _load_customer_orders(self, customer_ids):
+        orders = defaultdict(list)
+        for order in Order.objects.filter(customer_id__in=customer_ids).order_by('pk'):
+            orders[order.customer_id].append(order)
+        self.prime(o for group in orders.values() for o in group)
+        return orders
+
+    def _load_product_orders(self, product_ids):
+        through = Order.products.through
+        rows = through.objects.filter(product_id__in=product_ids).select_related('order').order_by('pk')
+        orders = defaultdict(list)
+        for row in rows:
+            orders[row.product_id].append(row.order)
+        self.prime(o for group in orders.values() for o in group)
+        return orders
+
+
+def _is_prefetched(instance, name):
+    return name in getattr(instance, '_prefetched_objects_cache', {})
+
+
+async def alist(queryset):
+    """Evaluate ``queryset`` through the async ORM."""
+    if queryset._prefetch_related_lookups:
+        # aiterator() does not support prefetch_related() before Django 5.0
+        return [instance async for instance in queryset]
+    return [instance async for instance in queryset.aiterator()]
+
+
+def is_async(context):
+    """Whether ``context`` belongs to a request run by the async executor."""
+    if isinstance(context, dict):
+        return context.get('crm_async', False)
+    return getattr(context, 'crm_async', False)
+
+
+def get_loaders(info):
+    """Return the loaders bound to the current request, creating them once."""
+    context = info.context
+    if context is None:
+        # No request to hang the cache on; resolve without batching.
+        return Loaders()
+    # A request may run sync and async executions (a mutation and a query of
+    # one batch); each gets loaders of its own kind.
+    async_mode = is_async(context)
+    name = 'crm_async_loaders' if async_mode else 'crm_loaders'
+    if isinstance(context, dict):
+        if name not in context:
+            context[name] = Loaders(async_mode)
+        return context[name]
+    loaders = getattr(context, name, None)
+    if loaders is None:
+        loaders = Loaders(async_mode)
+        setattr(context, name, loaders)
+    return loaders
+
+
+def reset_loaders(context):
+    """Drop the loaders of ``context`` so later lookups see fresh rows."""
+    for name in ('crm_loaders', 'crm_async_loaders'):
+        if isinstance(context, dict):
+            context.pop(name, None)
+        elif context is not None and hasattr(context, name):
+            delattr(context, name)
@@ -0,0 +1,99 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from crm import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the GraphQL, filter, mutation and cron benchmarks against a seeded synthetic dataset "
+        "in a throwaway test database (see DATABASES['default']['TEST'])."
+    )
+
+    def add_arguments(self, parser):
+        defaults = benchmark.Dataset()
+        parser.add_argument('--customers', type=int, default=defaults.customers)
+        parser.add_argument('--products', type=int, default=defaults.products)
+        parser.add_argument('--orders', type=int, default=defaults.orders)
+        parser.add_argument('--items-per-order', type=int, default=defaults.items_per_order,
+                            help="Most products per order; each order gets 1 to this many.")
+        parser.add_argument('--seed', type=int, default=defaults.seed)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--scenario', action='append', default=[],
+                            help="Only run scenarios whose name contains this; may be repeated.")
+        parser.add_argument('--startup-runs', type=int, default=5,
+                            help="Fresh interpreters timed for django.setup() and the schema build; 0 skips.")
+        parser.add_argument('--concurrency-seconds', type=float, default=2,
+                            help="Seconds of concurrent reads and writes, with SQLite's defaults and tuned; 0 skips.")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--baseline', help="JSON results to compare against; regressions fail the command.")
+        parser.add_argument('--threshold', type=float, default=benchmark.DEFAULT_THRESHOLD,
+                            help="Allowed p50 slowdown over the baseline, as a fraction.")
+
+    def handle(self, *args, **options):
+        dataset = benchmark.Dataset(
+            options['customers'], options['products'], options['orders'], options['items_per_order'], options['seed']
+        )
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as source:
+                baseline = json.load(source)
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # Measure the work itself, not the debug query log or cached responses
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver'],
+                                   GRAPHQL_RESPONSE_CACHE={'ENABLED': False}):
+                results = self.run_benchmarks(dataset, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+            self.stdout.write(f"Wrote {options['output']}")
+
+        if baseline is not None:
+            regressions = benchmark.compare(results, baseline, options['threshold'])
+            if regressions:
+                raise CommandError("Regressions against the baseline:\n  " + "\n  ".join(regressions))
+            self.stdout.write("No regressions against the baseline")
+
+    def run_benchmarks(self, dataset, options):
+        counts = benchmark.generate(dataset)
+        self.stdout.write("Dataset: " + ", ".join(f"{count} {name}" for name, count in counts.items()))
+
+        scenarios = [
+            scenario for scenario in benchmark.build_scenarios()
+            if not options['scenario'] or any(part in scenario.name for part in options['scenario'])
+        ]
+        results = {
+            'dataset': dataset._asdict(),
+            'environment': benchmark.environment(),
+            'scenarios': {},
+        }
+        self.stdout.write(f"{'scenario':<48} {'ops/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'queries':>8}")
+        for scenario in scenarios:
+            result = benchmark.run_scenario(scenario, options['iterations'], options['warmup'])
+            results['scenarios'][scenario.name] = result
+            self.stdout.write(
+                f"{scenario.name:<48} {result['ops_per_sec']:>9} {result['p50_ms']:>9} "
+                f"{result['p99_ms']:>9} {result['queries']:>8}"
+            )
+        if options['startup_runs']:
+            results['startup'] = benchmark.startup(options['startup_runs'])
+            self.stdout.write(
+                "Startup: " + ", ".join(f"{phase} {ms}" for phase, ms in results['startup'].items())
+            )
+        if options['concurrency_seconds']:
+            results['concurrency'] = benchmark.compare_tuning(options['concurrency_seconds'])
+            for mode, result in results['concurrency'].items():
+                self.stdout.write(
+                    f"Concurrency ({mode}): {result['reads_per_sec']} reads/s, "
+                    f"{result['writes_per_sec']} writes/s, {result['errors']} lock errors"
+                )
+        return results
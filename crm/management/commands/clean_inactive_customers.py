@@ -0,0 +1,87 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from crm import response_cache, search
+from crm.models import Customer, CustomerStats, Order, Product
+
+
+def delete_customers(ids):
+    """Delete customers ``ids`` with their stats, orders and order lines.
+
+    Returns the deleted row counts as ``(customers, orders, order_products)``.
+    Signals are not sent; the search index and response cache are updated here.
+    """
+    placeholders = ', '.join(['%s'] * len(ids))
+    through = Order.products.through._meta.db_table
+    orders = Order._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {through} WHERE order_id IN '
+            f'(SELECT id FROM {orders} WHERE customer_id IN ({placeholders}))',
+            ids,
+        )
+        order_products = cursor.rowcount
+        cursor.execute(f'DELETE FROM {orders} WHERE customer_id IN ({placeholders})', ids)
+        order_count = cursor.rowcount
+        cursor.execute(f'DELETE FROM {CustomerStats._meta.db_table} WHERE customer_id IN ({placeholders})', ids)
+        cursor.execute(f'DELETE FROM {Customer._meta.db_table} WHERE id IN ({placeholders})', ids)
+        customers = cursor.rowcount
+    search.remove(Customer, ids)
+    response_cache.invalidate(Customer, Order, Product)
+    return customers, order_count, order_products
+
+
+class Command(BaseCommand):
+    help = "Delete customers without orders in the last --days days, in small transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--chunk-size', type=int, default=500, help="Customers deleted per transaction.")
+        parser.add_argument('--sleep', type=float, default=0, help="Seconds to pause between chunks.")
+        parser.add_argument('--dry-run', action='store_true', help="Count inactive customers without deleting.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        # NOT EXISTS on crm_order_customer_date_idx, instead of an anti-join
+        # that has to be de-duplicated with DISTINCT
+        recent_orders = Order.objects.filter(customer=OuterRef('pk'), order_date__gte=cutoff)
+        inactive = Customer.objects.filter(~Exists(recent_orders))
+
+        totals = [0, 0, 0]
+        started = time.perf_counter()
+        last_pk = 0
+        while True:
+            ids = list(
+                inactive.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:options['chunk_size']]
+            )
+            if not ids:
+                break
+            last_pk = ids[-1]
+            if options['dry_run']:
+                totals[0] += len(ids)
+                continue
+
+            with transaction.atomic():
+                # A customer may have ordered since the chunk was selected
+                ids = list(inactive.filter(pk__in=ids).values_list('pk', flat=True))
+                if ids:
+                    for i, count in enumerate(delete_customers(ids)):
+                        totals[i] += count
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        elapsed = time.perf_counter() - started
+        customers, orders, order_products = totals
+        if options['dry_run']:
+            self.stdout.write(f"Would delete {customers} inactive customers")
+            return
+        rate = sum(totals) / elapsed if elapsed else 0
+        self.stdout.write(
+            f"Deleted {customers} inactive customers, {orders} orders and {order_products} order lines "
+            f"in {elapsed:.2f}s ({rate:.0f} rows/s)"
+        )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm import export
+from crm.filters import OrderFilter
+from crm.models import Order
+
+
+class Command(BaseCommand):
+    help = "Stream orders as NDJSON or CSV, optionally filtered by order date."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(export.RENDERERS), default='ndjson')
+        parser.add_argument('--output', help="File to write to; defaults to stdout.")
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE)
+        parser.add_argument('--order-date-gte', help="ISO datetime; only orders placed at or after it.")
+        parser.add_argument('--order-date-lte', help="ISO datetime; only orders placed at or before it.")
+
+    def handle(self, *args, **options):
+        filterset = OrderFilter(
+            {
+                'order_date_gte': options['order_date_gte'],
+                'order_date_lte': options['order_date_lte'],
+            },
+            queryset=Order.objects.all(),
+        )
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors.as_text())
+
+        blocks = export.render(filterset.qs, options['format'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(blocks)
+        else:
+            for block in blocks:
+                self.stdout.write(block, ending='')
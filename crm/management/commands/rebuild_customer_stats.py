@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from crm import stats
+from crm.models import CustomerStats
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-customer order statistics from the orders table."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            stats.rebuild()
+        self.stdout.write(f"Rebuilt order statistics for {CustomerStats.objects.count()} customers")
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from crm import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the customer and product search index from their tables."
+
+    def handle(self, *args, **options):
+        for model in search.SEARCH_FIELDS:
+            search.rebuild(model)
+            self.stdout.write(f"Rebuilt search index for {model._meta.verbose_name_plural}")
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from crm import query_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Record the SQL queries of every snapshotted GraphQL operation, against seeded datasets of "
+        f"{' and '.join(map(str, query_counts.SIZES))} rows in a throwaway test database, "
+        "and write them to crm/query_counts.json."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--counts-only', action='store_true', help="Snapshot query counts without their SQL.")
+        parser.add_argument('--check', action='store_true',
+                            help="Compare against the snapshot instead of writing it; regressions fail the command.")
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            runs = {size: query_counts.record_all(size) for size in query_counts.SIZES}
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        growing = query_counts.growing(runs)
+        if growing:
+            raise CommandError("Queries grow with the number of rows:\n" + "\n".join(growing))
+        recorded = runs[max(runs)]
+
+        if options['check']:
+            regressions = query_counts.compare(recorded, query_counts.load())
+            if regressions:
+                raise CommandError("Regressions against the snapshot:\n" + "\n".join(regressions))
+            self.stdout.write("No regressions against the snapshot")
+            return
+
+        query_counts.save(query_counts.snapshot(recorded, sql=not options['counts_only']))
+        for name, queries in sorted(recorded.items()):
+            self.stdout.write(f"{name:<32} {len(queries):>3} queries")
+        self.stdout.write(f"Wrote {query_counts.SNAPSHOT_PATH}")
@@ -0,0 +1,43 @@
+import signal
+from concurrent.futures import wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.scheduler import Job, Scheduler
+
+
+class Command(BaseCommand):
+    help = "Run the CRONJOBS in this process on a thread pool until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Jobs that may run at the same time.")
+        parser.add_argument('--jitter', type=float, default=0, help="Delay each run by up to this many seconds.")
+        parser.add_argument('--once', action='store_true', help="Run every job once now, then exit.")
+
+    def handle(self, *args, **options):
+        jobs = [Job.from_setting(entry) for entry in getattr(settings, 'CRONJOBS', [])]
+        if not jobs:
+            raise CommandError("No jobs in CRONJOBS.")
+        scheduler = Scheduler(jobs, max_workers=options['workers'], jitter=options['jitter'])
+
+        try:
+            if options['once']:
+                wait([scheduler.executor.submit(job.run) for job in jobs])
+            else:
+                for job in jobs:
+                    self.stdout.write(f"{job.path} ({job.schedule.expression}) next at {job.next_run:%Y-%m-%d %H:%M:%S}")
+                signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+                scheduler.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            scheduler.shutdown()
+
+        for job in jobs:
+            metrics = job.get_metrics()
+            mean = metrics['total_duration'] / metrics['runs'] if metrics['runs'] else 0
+            self.stdout.write(
+                f"{job.path}: {metrics['runs']} runs, {metrics['failures']} failures, "
+                f"{metrics['skipped']} skipped, max {metrics['max_duration']:.3f}s, mean {mean:.3f}s"
+            )
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+SEARCH_TABLES = {
+    'crm_customer': ('name', 'email'),
+    'crm_product': ('name',),
+}
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, fields in SEARCH_TABLES.items():
+        columns = ', '.join(fields)
+        if vendor == 'sqlite':
+            values = ', '.join(f"COALESCE({field}, '')" for field in fields)
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {table}_search USING fts5({columns}, tokenize='trigram')"
+            )
+            schema_editor.execute(
+                f"INSERT INTO {table}_search (rowid, {columns}) SELECT id, {values} FROM {table}"
+            )
+        elif vendor == 'postgresql':
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for field in fields:
+                schema_editor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {table}_{field}_trgm '
+                    f'ON {table} USING gin ({field} gin_trgm_ops)'
+                )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, fields in SEARCH_TABLES.items():
+        if vendor == 'sqlite':
+            schema_editor.execute(f'DROP TABLE IF EXISTS {table}_search')
+        elif vendor == 'postgresql':
+            for field in fields:
+                schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{field}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0002_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-18 04:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Same statement as crm.stats.REBUILD_SQL, frozen here
+POPULATE_SQL = (
+    'INSERT INTO crm_customerstats (customer_id, order_count, lifetime_value, last_order_date) '
+    'SELECT c.id, COUNT(o.id), COALESCE(SUM(o.total_amount), 0), MAX(o.order_date) '
+    'FROM crm_customer c LEFT JOIN crm_order o ON o.customer_id = c.id GROUP BY c.id'
+)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0003_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='crm.customer')),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('lifetime_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('last_order_date', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='customerstats',
+            index=models.Index(fields=['order_count'], name='crm_stats_order_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerstats',
+            index=models.Index(fields=['lifetime_value'], name='crm_stats_lifetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerstats',
+            index=models.Index(fields=['last_order_date'], name='crm_stats_last_order_idx'),
+        ),
+        migrations.RunSQL(POPULATE_SQL, migrations.RunSQL.noop),
+    ]
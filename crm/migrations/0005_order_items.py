@@ -0,0 +1,55 @@
+# Generated by Django 4.2 on 2026-10-18 04:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Existing links become one-unit lines priced at the product's current
+# price, the closest snapshot available; order totals are left as they are.
+COPY_LINKS_SQL = (
+    'INSERT INTO crm_orderitem (order_id, product_id, quantity, unit_price) '
+    'SELECT op.order_id, op.product_id, 1, p.price '
+    'FROM crm_order_products op JOIN crm_product p ON p.id = op.product_id ORDER BY op.id'
+)
+
+RESTORE_LINKS_SQL = (
+    'INSERT INTO crm_order_products (order_id, product_id) '
+    'SELECT order_id, product_id FROM crm_orderitem ORDER BY id'
+)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_customer_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='crm.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_items', to='crm.product')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['product', 'order'], name='crm_orderitem_product_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='orderitem',
+            constraint=models.UniqueConstraint(fields=('order', 'product'), name='crm_orderitem_order_product_uniq'),
+        ),
+        migrations.RunSQL(COPY_LINKS_SQL, RESTORE_LINKS_SQL),
+        # A many-to-many field cannot gain a through model in place
+        migrations.RemoveField(
+            model_name='order',
+            name='products',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='products',
+            field=models.ManyToManyField(through='crm.OrderItem', to='crm.product'),
+        ),
+    ]
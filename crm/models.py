@@ -6,6 +6,12 @@ class Customer(models.Model):
     email = models.EmailField(unique=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # created_at filters and keyset pagination
+            models.Index(fields=['created_at', 'id'], name='crm_customer_created_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -15,15 +21,75 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='crm_product_created_idx'),
+            models.Index(fields=['price'], name='crm_product_price_idx'),
+            models.Index(fields=['stock'], name='crm_product_stock_idx'),
+            # lowStock filter and the UpdateLowStockProducts restock
+            models.Index(fields=['stock'], condition=models.Q(stock__lt=10), name='crm_product_low_stock_idx'),
+        ]
     
     def __str__(self):
         return self.name
 
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
-    products = models.ManyToManyField(Product)
+    products = models.ManyToManyField(Product, through='OrderItem')
     order_date = models.DateTimeField(auto_now_add=True)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order_date', 'id'], name='crm_order_date_idx'),
+            models.Index(fields=['total_amount'], name='crm_order_total_idx'),
+            models.Index(fields=['customer', 'order_date'], name='crm_order_customer_date_idx'),
+        ]
     
     def __str__(self):
         return f"Order {self.id} by {self.customer.name}"
+
+class OrderItem(models.Model):
+    """One product of an order, with the quantity and price it was ordered at.
+
+    ``Order.total_amount`` is the sum of its lines, kept in step by
+    ``crm.order_items.update_totals``.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='order_items')
+    quantity = models.PositiveIntegerField(default=1)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'product'], name='crm_orderitem_order_product_uniq'),
+        ]
+        indexes = [
+            # Orders of a product, and product revenue aggregates
+            models.Index(fields=['product', 'order'], name='crm_orderitem_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x product {self.product_id} in order {self.order_id}"
+
+class CustomerStats(models.Model):
+    """Per-customer order aggregates, kept up to date by crm.signals.
+
+    Rebuild with ``manage.py rebuild_customer_stats`` after writes that
+    bypass signals.
+    """
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    order_count = models.PositiveIntegerField(default=0)
+    lifetime_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_order_date = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order_count'], name='crm_stats_order_count_idx'),
+            models.Index(fields=['lifetime_value'], name='crm_stats_lifetime_idx'),
+            models.Index(fields=['last_order_date'], name='crm_stats_last_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"Stats for customer {self.customer_id}"
@@ -0,0 +1,112 @@
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_camel_case, to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+from .models import Customer, Product, Order
+
+# GraphQL fields of a model that read a column of a one-to-one relation
+RELATED_COLUMNS = {
+    Customer: {
+        'order_count': 'stats__order_count',
+        'lifetime_value': 'stats__lifetime_value',
+        'last_order_date': 'stats__last_order_date',
+    },
+}
+
+
+def selected_fields(selection_sets, info):
+    """Map each field name selected in ``selection_sets`` to its sub-selections.
+
+    Fragments and inline fragments are flattened, and a relay connection
+    (``edges { node { ... } }``) is unwrapped to the fields of its nodes.
+    """
+    fields = {}
+    for selection_set in selection_sets:
+        if selection_set is not None:
+            _collect(selection_set, info, fields)
+    if 'edges' in fields:
+        edges = selected_fields(fields['edges'], info)
+        return selected_fields(edges.get('node', []), info)
+    return fields
+
+
+def _collect(selection_set, info, fields):
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            fields.setdefault(selection.name.value, []).append(selection.selection_set)
+        elif isinstance(selection, InlineFragmentNode):
+            _collect(selection.selection_set, info, fields)
+        elif isinstance(selection, FragmentSpreadNode):
+            _collect(info.fragments[selection.name.value].selection_set, info, fields)
+
+
+def _columns(model, fields):
+    """Return the columns of ``model`` needed for ``fields``.
+
+    ``None`` means a selected field could not be mapped to the model (e.g. a
+    custom resolver), in which case every column is loaded rather than risk
+    a deferred-field query per row.
+    """
+    concrete = {f.name for f in model._meta.concrete_fields}
+    related_columns = RELATED_COLUMNS.get(model, {})
+    related = {f.name for f in model._meta.many_to_many}
+    related.update(rel.get_accessor_name() for rel in model._meta.related_objects)
+
+    # Foreign keys are always kept: the loaders read them to batch lookups.
+    columns = {model._meta.pk.name}
+    columns.update(f.name for f in model._meta.concrete_fields if f.is_relation)
+    for name in fields:
+        if name.startswith('__'):
+            continue
+        field_name = to_snake_case(name)
+        if field_name in concrete:
+            columns.add(field_name)
+        elif field_name in related_columns:
+            columns.add(related_columns[field_name])
+        elif field_name not in related:
+            return None
+    return sorted(columns)
+
+
+def _select_related(queryset, model, fields, prefix=''):
+    """Join the one-to-one relations read by ``fields`` (see RELATED_COLUMNS)."""
+    relations = {
+        column.split('__')[0]
+        for name, column in RELATED_COLUMNS.get(model, {}).items()
+        if to_camel_case(name) in fields or name in fields
+    }
+    if relations:
+        queryset = queryset.select_related(*(prefix + relation for relation in sorted(relations)))
+    return queryset
+
+
+def optimize(queryset, info):
+    """Trim ``queryset`` to the columns and relations the current field selects.
+
+    Applies ``only()`` for the requested columns, ``select_related`` for
+    ``Order.customer`` and the relations in ``RELATED_COLUMNS``, and a
+    ``Prefetch`` restricted to the requested product columns for
+    ``Order.products``.
+    """
+    fields = selected_fields([node.selection_set for node in info.field_nodes], info)
+    only = _columns(queryset.model, fields)
+    queryset = _select_related(queryset, queryset.model, fields)
+
+    if queryset.model is Order:
+        if 'customer' in fields:
+            customer_fields = selected_fields(fields['customer'], info)
+            queryset = queryset.select_related('customer')
+            queryset = _select_related(queryset, Customer, customer_fields, 'customer__')
+            customer_columns = _columns(Customer, customer_fields)
+            if only is not None and customer_columns is not None:
+                only += ['customer__' + column for column in customer_columns]
+        if 'products' in fields:
+            products = Product.objects.all()
+            product_columns = _columns(Product, selected_fields(fields['products'], info))
+            if product_columns is not None:
+                products = products.only(*product_columns)
+            queryset = queryset.prefetch_related(Prefetch('products', queryset=products))
+
+    if only is not None:
+        queryset = queryset.only(*only)
+    return queryset
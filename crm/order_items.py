@@ -0,0 +1,43 @@
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Order, OrderItem
+from . import response_cache, stats
+
+LINE_TOTAL = F('quantity') * F('unit_price')
+
+
+def add_items(order, quantities):
+    """Add ``quantities`` (``{product: quantity}``) to ``order`` at the products' current prices.
+
+    The lines are inserted with one bulk INSERT and the total recomputed in
+    SQL; ``order.total_amount`` is set to the same sum without reading the
+    row back.
+    """
+    items = OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=product, quantity=quantity, unit_price=product.price)
+        for product, quantity in quantities.items()
+    ])
+    update_totals([order.pk])
+    order.total_amount = sum((item.quantity * item.unit_price for item in items), Decimal('0'))
+    return items
+
+
+def update_totals(order_ids):
+    """Recompute ``total_amount`` of ``order_ids`` from their lines, with a single UPDATE.
+
+    The UPDATE sends no signals, so the customers' stats are refreshed here.
+    """
+    lines = (
+        OrderItem.objects.filter(order=OuterRef('pk'))
+        .order_by()
+        .values('order')
+        .annotate(total=Sum(LINE_TOTAL, output_field=DecimalField()))
+        .values('total')
+    )
+    orders = Order.objects.filter(pk__in=order_ids)
+    orders.update(total_amount=Coalesce(Subquery(lines), Value(Decimal('0'))))
+    stats.refresh(orders.values('customer_id'))
+    response_cache.invalidate(Order)
@@ -0,0 +1,209 @@
+import base64
+import json
+from functools import partial
+
+import graphene
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.utils import maybe_queryset
+
+from .loaders import alist, get_loaders
+
+
+class PrimedConnection(graphene.relay.Connection):
+    """Relay connection that primes the loaders with the nodes of each page.
+
+    ``totalCount`` is only computed when the client selects it.
+    """
+
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int()
+
+    def resolve_edges(self, info):
+        get_loaders(info).prime(edge.node for edge in self.edges)
+        return self.edges
+
+    def resolve_total_count(self, info):
+        if getattr(self, 'length', None) is not None:
+            return self.length
+        if get_loaders(info).is_async:
+            return maybe_queryset(self.iterable).acount()
+        return maybe_queryset(self.iterable).count()
+
+
+_connections = {}
+
+
+def connection_for(node_type):
+    """Return the ``PrimedConnection`` of ``node_type``, creating it on first use."""
+    connection = node_type._meta.connection or _connections.get(node_type)
+    if connection is None:
+        connection = PrimedConnection.create_type(f'{node_type.__name__}Connection', node=node_type)
+        _connections[node_type] = connection
+    return connection
+
+
+class KeysetConnectionField(DjangoFilterConnectionField):
+    """Filter connection paginated on ``(order_key, id)`` instead of OFFSET.
+
+    Cursors encode the order key and id of a row, and a page is fetched with
+    ``WHERE (order_key, id) > (cursor)`` on an index, so deep pages cost the
+    same as the first one and no ``COUNT(*)`` is run unless ``totalCount`` is
+    selected. ``offset`` is not supported. Results of a ranked ``search`` are
+    paged on ``(search_rank, id)`` instead, and a filterset ordering on an
+    annotation (such as ``CustomerFilter.order_by``) pages on that
+    annotation, in its direction.
+    """
+
+    def __init__(self, type_, *args, order_key='created_at', **kwargs):
+        self.order_key = order_key
+        super().__init__(type_, *args, **kwargs)
+        self._base_args.pop('offset', None)
+
+    @property
+    def type(self):
+        # Built here rather than by DjangoObjectType, so only types served
+        # as a connection get one and their relations stay plain lists
+        node_type = super(graphene.relay.ConnectionField, self).type
+        return connection_for(node_type)
+
+    def sort_key(self, queryset):
+        """Return the ``(key, descending)`` the page is ordered on."""
+        # A ranked search orders by relevance instead of the order key
+        if 'search_rank' in queryset.query.annotations:
+            return 'search_rank', False
+        ordering = queryset.query.order_by
+        if ordering and isinstance(ordering[0], str):
+            name = ordering[0].lstrip('-')
+            if name in queryset.query.annotations:
+                return name, ordering[0].startswith('-')
+        return self.order_key, False
+
+    def encode_cursor(self, node, key):
+        value = getattr(node, key)
+        raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else str(value), node.pk])
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, cursor, queryset, key):
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except (ValueError, TypeError):
+            raise Exception(f"Invalid cursor: {cursor}")
+        if key == 'search_rank':
+            return float(value), pk
+        if key in queryset.query.annotations:
+            return queryset.query.annotations[key].output_field.to_python(value), pk
+        return self.model._meta.get_field(key).to_python(value), pk
+
+    def seek(self, queryset, cursor, key, lookup):
+        value, pk = self.decode_cursor(cursor, queryset, key)
+        return queryset.filter(Q(**{f'{key}__{lookup}': value}) | Q(**{key: value, f'pk__{lookup}': pk}))
+
+    def after(self, queryset, cursor, key, descending=False):
+        return self.seek(queryset, cursor, key, 'lt' if descending else 'gt')
+
+    def before(self, queryset, cursor, key, descending=False):
+        return self.seek(queryset, cursor, key, 'gt' if descending else 'lt')
+
+    def keyset_resolver(self, resolver, connection, default_manager, queryset_resolver, root, info, **args):
+        page = partial(
+            self.page_queryset, resolver, connection, default_manager, queryset_resolver, root, info, **args
+        )
+        if get_loaders(info).is_async:
+            return self.aresolve_page(page)
+        queryset, build_page = page()
+        return build_page(list(queryset))
+
+    async def aresolve_page(self, page):
+        # Resolvers and filtersets may touch the database, so they run off
+        # the event loop; the page itself is fetched with the async ORM.
+        queryset, build_page = await sync_to_async(page)()
+        return build_page(await alist(queryset))
+
+    def page_queryset(self, resolver, connection, default_manager, queryset_resolver, root, info, **args):
+        """Return the queryset of one page and a function building the connection from its rows."""
+        first = args.get('first')
+        last = args.get('last')
+
+        if self.enforce_first_or_last:
+            assert first or last, (
+                "You must provide a `first` or `last` value to properly paginate the `{}` connection."
+            ).format(info.field_name)
+
+        if self.max_limit:
+            for name, value in (('first', first), ('last', last)):
+                assert not value or value <= self.max_limit, (
+                    "Requesting {} records on the `{}` connection exceeds the `{}` limit of {} records."
+                ).format(value, info.field_name, name, self.max_limit)
+            if first is None and last is None:
+                first = self.max_limit
+
+        iterable = resolver(root, info, **args)
+        if iterable is None:
+            iterable = default_manager
+        queryset = maybe_queryset(queryset_resolver(connection, iterable, info, args))
+        total = queryset
+        key, descending = self.sort_key(queryset)
+
+        # The cursor is built from the order key, so it must not be deferred
+        # by the selection-set optimizer.
+        fields, defer = queryset.query.deferred_loading
+        if fields and not defer:
+            queryset = queryset.only(*fields, self.order_key)
+
+        if args.get('after'):
+            queryset = self.after(queryset, args['after'], key, descending)
+        if args.get('before'):
+            queryset = self.before(queryset, args['before'], key, descending)
+
+        backwards = last is not None and first is None
+        # Paging backwards reads the rows in reverse and flips them back
+        sign = '-' if descending != backwards else ''
+        queryset = queryset.order_by(f'{sign}{key}', f'{sign}pk')
+        if backwards:
+            queryset = queryset[:last + 1]
+        else:
+            if first is not None:
+                queryset = queryset[:first + 1]
+
+        def build_page(nodes):
+            if backwards:
+                has_previous_page = len(nodes) > last
+                nodes = nodes[:last][::-1]
+                has_next_page = bool(args.get('before'))
+            else:
+                has_next_page = first is not None and len(nodes) > first
+                nodes = nodes[:first]
+                has_previous_page = bool(args.get('after'))
+                if last is not None:
+                    # As in Relay, `last` with `first` keeps the end of the first slice
+                    has_previous_page = has_previous_page or len(nodes) > last
+                    nodes = nodes[max(len(nodes) - last, 0):]
+
+            edges = [connection.Edge(node=node, cursor=self.encode_cursor(node, key)) for node in nodes]
+            page = connection(
+                edges=edges,
+                page_info=graphene.relay.PageInfo(
+                    start_cursor=edges[0].cursor if edges else None,
+                    end_cursor=edges[-1].cursor if edges else None,
+                    has_previous_page=has_previous_page,
+                    has_next_page=has_next_page,
+                ),
+            )
+            page.iterable = total
+            page.length = None
+            return page
+
+        return queryset, build_page
+
+    def wrap_resolve(self, parent_resolver):
+        return partial(
+            self.keyset_resolver,
+            parent_resolver,
+            self.connection_type,
+            self.get_manager(),
+            self.get_queryset_resolver(),
+        )
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from graphql import GraphQLError, parse, print_ast, validate
+
+
+def query_hash(query):
+    """SHA-256 hex digest of a query's text, as sent by APQ clients."""
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+def get_setting(name, default=None):
+    return getattr(settings, 'GRAPHQL_PERSISTED_QUERIES', {}).get(name, default)
+
+
+class DocumentStore:
+    """Parsed and validated documents for one schema, keyed by query hash.
+
+    Operations from the registry are compiled once up front and never
+    evicted; any other query that validates is kept in an LRU of
+    ``cache_size`` documents so repeated requests skip parse and validate.
+    """
+
+    def __init__(self, schema, registry=(), cache_size=256):
+        self.schema = schema
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()
+        self._registered = {}
+        for query in registry:
+            document, errors = self.compile(query)
+            if errors:
+                raise ImproperlyConfigured(
+                    f"Persisted query is invalid: {errors[0].message}\n{query}"
+                )
+            # Clients that print the document before sending it (gql does)
+            # hash the normalized text, so register both forms.
+            self._registered[query_hash(query)] = document
+            self._registered[query_hash(print_ast(document))] = document
+
+    def compile(self, query):
+        """Return ``(document, errors)`` for ``query`` without caching."""
+        try:
+            document = parse(query)
+        except GraphQLError as e:
+            return None, [e]
+        return document, validate(self.schema.graphql_schema, document)
+
+    def is_registered(self, sha256):
+        return sha256 in self._registered
+
+    def get(self, sha256):
+        """Return the cached document for ``sha256``, or ``None``."""
+        document = self._registered.get(sha256)
+        if document is None:
+            with self._lock:
+                document = self._lru.get(sha256)
+                if document is not None:
+                    self._lru.move_to_end(sha256)
+        return document
+
+    def document_for(self, query, sha256=None):
+        """Return ``(document, errors)`` for ``query``, compiling it on a miss."""
+        sha256 = sha256 or query_hash(query)
+        document = self.get(sha256)
+        if document is not None:
+            return document, []
+        document, errors = self.compile(query)
+        if not errors:
+            with self._lock:
+                self._lru[sha256] = document
+                while len(self._lru) > self.cache_size:
+                    self._lru.popitem(last=False)
+        return document, errors
+
+    def __len__(self):
+        return len(self._lru)
+
+
+def load_registry(path):
+    """Read the allowed operations: a JSON object of name -> query, or a list."""
+    if not path:
+        return []
+    with open(path) as registry_file:
+        registry = json.load(registry_file)
+    return list(registry.values()) if isinstance(registry, dict) else list(registry)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_document_store(schema):
+    """Return the process-wide store for ``schema``, building it on first use."""
+    store = _stores.get(schema)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(schema)
+            if store is None:
+                store = DocumentStore(
+                    schema,
+                    registry=load_registry(get_setting('REGISTRY')),
+                    cache_size=get_setting('CACHE_SIZE', 256),
+                )
+                _stores[schema] = store
+    return store
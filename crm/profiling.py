@@ -0,0 +1,282 @@
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from inspect import isawaitable
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Request header asking for the operation's profile in ``extensions``
+    'HEADER': 'X-GraphQL-Profile',
+    # Whether the header is honoured; None follows settings.DEBUG
+    'EXPOSE': None,
+    # Latest operations per name kept for the percentiles
+    'WINDOW': 1000,
+    'QUANTILES': (0.5, 0.9, 0.99),
+    # Further operation names are reported as "other"
+    'MAX_OPERATIONS': 200,
+}
+
+_request = ContextVar('crm_profile_request', default=None)
+_operation = ContextVar('crm_profile_operation', default=None)
+_path = ContextVar('crm_profile_path', default=None)
+
+
+def get_setting(name):
+    return getattr(settings, 'GRAPHQL_PROFILING', {}).get(name, DEFAULTS[name])
+
+
+def wants_details(request):
+    expose = get_setting('EXPOSE')
+    if not (settings.DEBUG if expose is None else expose):
+        return False
+    return bool(request.headers.get(get_setting('HEADER')))
+
+
+class OperationProfile:
+    """SQL and resolver timings of one GraphQL operation."""
+
+    def __init__(self, name, detailed=False):
+        self.name = name
+        self.detailed = detailed
+        self.queries = 0
+        self.sql_time = 0.0
+        self.started = time.perf_counter()
+        self.duration = None
+        # Field path (list indices dropped) -> [calls, queries, seconds]
+        self.fields = defaultdict(lambda: [0, 0, 0.0])
+
+    def record_query(self, duration):
+        self.queries += 1
+        self.sql_time += duration
+        if self.detailed:
+            self.fields[_path.get()][1] += 1
+
+    def record_field(self, path, duration):
+        field = self.fields[path]
+        field[0] += 1
+        field[2] += duration
+
+    def finish(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self.started
+        return self.duration
+
+    def as_extension(self):
+        resolvers = {
+            path: {'calls': calls, 'queries': queries, 'timeMs': round(seconds * 1000, 3)}
+            for path, (calls, queries, seconds) in self.fields.items()
+            if path is not None
+        }
+        return {
+            'operation': self.name,
+            'durationMs': round(self.finish() * 1000, 3),
+            'queries': self.queries,
+            'sqlMs': round(self.sql_time * 1000, 3),
+            'resolvers': resolvers,
+            # A field issuing a query per item of its parent list
+            'nPlusOne': sorted(
+                path for path, info in resolvers.items() if info['calls'] > 1 and info['queries'] >= info['calls']
+            ),
+        }
+
+
+class RequestProfile:
+    def __init__(self, detailed=False):
+        self.detailed = detailed
+        self.operations = []
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper crediting each query to the running operation."""
+    operation = _operation.get()
+    if operation is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        operation.record_query(time.perf_counter() - started)
+
+
+def install(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def operation(name):
+    """Profile the GraphQL operation run inside the block, if the request is profiled."""
+    request = _request.get()
+    if request is None:
+        yield None
+        return
+    profile = OperationProfile(name or 'anonymous', request.detailed)
+    request.operations.append(profile)
+    token = _operation.set(profile)
+    try:
+        yield profile
+    finally:
+        profile.finish()
+        _operation.reset(token)
+
+
+def current_operation():
+    return _operation.get()
+
+
+def _field_path(path):
+    keys = []
+    while path is not None:
+        if isinstance(path.key, str):
+            keys.append(path.key)
+        path = path.prev
+    return '.'.join(reversed(keys))
+
+
+class GraphQLProfilingMiddleware:
+    """Graphene middleware timing each resolver of a profiled operation.
+
+    Only active for operations whose profile was asked for with the debug
+    header; the queries a resolver runs, including loader dispatches, are
+    credited to its field path.
+    """
+
+    def resolve(self, next, root, info, **args):
+        operation = _operation.get()
+        if operation is None or not operation.detailed:
+            return next(root, info, **args)
+        path = _field_path(info.path)
+        token = _path.set(path)
+        started = time.perf_counter()
+        try:
+            result = next(root, info, **args)
+        finally:
+            _path.reset(token)
+        if isawaitable(result):
+            return self._await(result, operation, path, started)
+        operation.record_field(path, time.perf_counter() - started)
+        return result
+
+    async def _await(self, result, operation, path, started):
+        token = _path.set(path)
+        try:
+            return await result
+        finally:
+            _path.reset(token)
+            operation.record_field(path, time.perf_counter() - started)
+
+
+class ProfilingMiddleware:
+    """Django middleware profiling the GraphQL operations of each request.
+
+    Operations are added to ``metrics`` once the response is built; the
+    view adds the profile to ``extensions`` when the debug header is set.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not get_setting('ENABLED'):
+            return self.get_response(request)
+        with self.profile(request) as profile:
+            response = self.get_response(request)
+        metrics.observe_all(profile.operations)
+        return response
+
+    async def __acall__(self, request):
+        if not get_setting('ENABLED'):
+            return await self.get_response(request)
+        with self.profile(request) as profile:
+            response = await self.get_response(request)
+        metrics.observe_all(profile.operations)
+        return response
+
+    @contextmanager
+    def profile(self, request):
+        profile = RequestProfile(wants_details(request))
+        token = _request.set(profile)
+        try:
+            yield profile
+        finally:
+            _request.reset(token)
+
+
+def _quantile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """Per-operation totals and a rolling window of samples for percentiles."""
+
+    # Prometheus summary name -> (help, OperationProfile attribute)
+    SERIES = {
+        'crm_graphql_operation_duration_seconds': ("GraphQL operation latency.", 'duration'),
+        'crm_graphql_operation_queries': ("SQL queries per GraphQL operation.", 'queries'),
+        'crm_graphql_operation_sql_seconds': ("SQL time per GraphQL operation.", 'sql_time'),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._windows = {}
+            self._totals = {}
+
+    def observe_all(self, operations):
+        for operation in operations:
+            self.observe(operation)
+
+    def observe(self, operation):
+        sample = tuple(getattr(operation, attr) for _, attr in self.SERIES.values())
+        with self._lock:
+            name = operation.name
+            if name not in self._windows and len(self._windows) >= get_setting('MAX_OPERATIONS'):
+                name = 'other'
+            if name not in self._windows:
+                self._windows[name] = deque(maxlen=get_setting('WINDOW'))
+                self._totals[name] = [0] + [0] * len(sample)
+            self._windows[name].append(sample)
+            totals = self._totals[name]
+            totals[0] += 1
+            for i, value in enumerate(sample):
+                totals[i + 1] += value
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            windows = {name: list(window) for name, window in self._windows.items()}
+            totals = {name: list(values) for name, values in self._totals.items()}
+        lines = []
+        for i, (series, (help_text, _)) in enumerate(self.SERIES.items()):
+            lines += [f'# HELP {series} {help_text}', f'# TYPE {series} summary']
+            for name in sorted(windows):
+                label = f'operation="{_label(name)}"'
+                values = [sample[i] for sample in windows[name]]
+                for q in get_setting('QUANTILES'):
+                    lines.append(f'{series}{{{label},quantile="{q}"}} {_quantile(values, q):.6g}')
+                lines.append(f'{series}_sum{{{label}}} {totals[name][i + 1]:.6g}')
+                lines.append(f'{series}_count{{{label}}} {totals[name][0]}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
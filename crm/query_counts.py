@@ -0,0 +1,254 @@
+import difflib
+import json
+import re
+from collections import namedtuple
+from contextlib import ExitStack, contextmanager
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.db import connection, reset_queries
+from django.db.models import F
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphene_django.settings import graphene_settings
+from graphql import OperationDefinitionNode, parse
+
+from .models import Customer, Product
+from .pagination import KeysetConnectionField
+from . import benchmark
+
+SNAPSHOT_PATH = Path(__file__).with_name('query_counts.json')
+
+# Dataset sizes (and page sizes) every operation is recorded at; its SQL
+# must be the same at each, or it grows with the number of rows
+SIZES = (1, 1000)
+SEED = 23
+
+# Rows per recorded bulk mutation or order; more would split their INSERTs
+# into several batches under SQLite's 999 parameters per statement
+MAX_INPUT_ROWS = 200
+
+# ``variables(size)`` runs before the queries are captured, so it may also
+# prepare rows for a mutation.
+Operation = namedtuple('Operation', 'query variables', defaults=(None,))
+
+
+def _page(size):
+    return {'first': size}
+
+
+def _bulk_customers(size):
+    return {'input': [
+        {'name': f"Recorded {n}", 'email': f"recorded{n}@example.com"} for n in range(min(size, MAX_INPUT_ROWS))
+    ]}
+
+
+def _order(size):
+    products = list(Product.objects.order_by('pk').values_list('pk', flat=True)[:min(size, MAX_INPUT_ROWS)])
+    Product.objects.filter(pk__in=products).update(stock=F('stock') + 1)
+    customer = Customer.objects.order_by('pk').values_list('pk', flat=True).first()
+    return {'input': {'customerId': customer, 'productIds': products}}
+
+
+OPERATIONS = [
+    Operation('query Hello { hello }'),
+    Operation(
+        'query Customers { customers { id name email phone createdAt orderCount lifetimeValue lastOrderDate '
+        'orderSet { id totalAmount } } }',
+    ),
+    Operation('query Products { products { id name price stock orderSet { id customer { email } } } }'),
+    Operation(
+        'query Orders($since: DateTime) { orders(orderDateGte: $since) { id orderDate totalAmount '
+        'customer { email orderCount } products { name } } }',
+        lambda size: {'since': (timezone.now() - timedelta(days=benchmark.ORDER_DAYS + 1)).isoformat()},
+    ),
+    Operation('query OrderStatsByProduct { orderStats(groupBy: PRODUCT) { key label orderCount revenue } }'),
+    Operation(
+        'query AllCustomers($first: Int) { allCustomers(first: $first, orderBy: "-lifetime_value") '
+        '{ totalCount pageInfo { hasNextPage endCursor } edges { node { id name orderCount lifetimeValue } } } }',
+        _page,
+    ),
+    Operation(
+        'query AllProducts($first: Int) { allProducts(first: $first) '
+        '{ totalCount pageInfo { hasNextPage endCursor } edges { node { id name price stock } } } }',
+        _page,
+    ),
+    Operation(
+        'query AllOrders($first: Int) { allOrders(first: $first) { totalCount edges { cursor node '
+        '{ id orderDate totalAmount customer { email orderCount } products { name } } } } }',
+        _page,
+    ),
+    Operation(
+        'query OrderStatsByCustomer { orderStats(groupBy: CUSTOMER) '
+        '{ key label orderCount revenue averageOrderValue } }',
+    ),
+    Operation(
+        'mutation CreateCustomer($input: CustomerInput!) { createCustomer(input: $input) '
+        '{ customer { id orderCount } message } }',
+        lambda size: {'input': {'name': "Recorded", 'email': "recorded@example.com", 'phone': "+15550100"}},
+    ),
+    Operation(
+        'mutation BulkCreateCustomers($input: [CustomerInput]!) { bulkCreateCustomers(input: $input) '
+        '{ customers { id } errors } }',
+        _bulk_customers,
+    ),
+    Operation(
+        'mutation CreateProduct { createProduct(input: {name: "Recorded", price: "9.99", stock: 3}) '
+        '{ product { id } } }',
+    ),
+    Operation(
+        'mutation CreateOrder($input: OrderInput!) { createOrder(input: $input) '
+        '{ order { id totalAmount customer { email } products { name } } } }',
+        _order,
+    ),
+    Operation(
+        'mutation UpdateLowStockProducts { updateLowStockProducts(threshold: 1000) '
+        '{ success message updatedProducts { id stock } } }',
+    ),
+]
+
+_LITERALS = [
+    # Savepoints are numbered per connection
+    (re.compile(r'"s\d+_x\d+"'), '"s?"'),
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\bNULL\b'), '?'),
+    # Lists whose length follows the data: IN lists and multi-row VALUES
+    (re.compile(r'\((?:\?, )*\?\)'), '(...)'),
+    (re.compile(r'\(\.\.\.\)(?:, \(\.\.\.\))+'), '(...)'),
+]
+
+
+def normalize(sql):
+    """Return ``sql`` with its literals replaced, so only its shape is compared."""
+    for pattern, replacement in _LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def get_schema():
+    return graphene_settings.SCHEMA
+
+
+def _operation_definition(query):
+    return next(d for d in parse(query).definitions if isinstance(d, OperationDefinitionNode))
+
+
+def operation_name(operation):
+    return _operation_definition(operation.query).name.value
+
+
+def uncovered(schema):
+    """Return the root fields of ``schema`` no operation selects, as ``Type.field``."""
+    covered = set()
+    for operation in OPERATIONS:
+        definition = _operation_definition(operation.query)
+        for selection in definition.selection_set.selections:
+            covered.add((definition.operation.value, selection.name.value))
+    graphql_schema = schema.graphql_schema
+    missing = []
+    for kind, root in (('query', graphql_schema.query_type), ('mutation', graphql_schema.mutation_type)):
+        missing += [f'{root.name}.{field}' for field in root.fields if (kind, field) not in covered]
+    return missing
+
+
+@contextmanager
+def page_limit(schema, limit):
+    """Let the connections of ``schema`` return pages of up to ``limit`` rows."""
+    with ExitStack() as stack:
+        for field in schema.query._meta.fields.values():
+            if isinstance(field, KeysetConnectionField):
+                stack.enter_context(mock.patch.object(field, 'max_limit', max(limit, field.max_limit or 0)))
+        yield
+
+
+def record(schema, operation, size):
+    """Run ``operation`` in a rolled-back transaction and return its normalized SQL."""
+    with benchmark.rolled_back():
+        variables = operation.variables(size) if operation.variables else None
+        # The query log is bounded; start from an empty one
+        reset_queries()
+        with CaptureQueriesContext(connection) as ctx:
+            result = schema.execute(
+                operation.query, variable_values=variables, context_value=RequestFactory().post('/graphql/')
+            )
+        queries = [normalize(query['sql']) for query in ctx.captured_queries]
+    if result.errors:
+        raise RuntimeError(f"{operation_name(operation)}: {result.errors}")
+    return queries
+
+
+def record_all(size, seed=SEED):
+    """Return ``{operation name: SQL}`` of every operation against ``size`` rows of each model.
+
+    The dataset is generated in a transaction that is rolled back afterwards.
+    """
+    schema = get_schema()
+    with benchmark.rolled_back(), page_limit(schema, size):
+        benchmark.generate(benchmark.Dataset(customers=size, products=size, orders=size, seed=seed))
+        return {
+            operation_name(operation): record(schema, operation, size)
+            for operation in OPERATIONS
+        }
+
+
+def _diff(expected, actual):
+    return '\n'.join(difflib.unified_diff(expected, actual, 'expected', 'actual', lineterm=''))
+
+
+def growing(runs):
+    """Return a message for each operation whose SQL differs between the sizes of ``runs``.
+
+    ``runs`` maps each size to its ``record_all`` result.
+    """
+    (small, first), *others = sorted(runs.items())
+    messages = []
+    for size, run in others:
+        for name, queries in first.items():
+            if run[name] != queries:
+                messages.append(
+                    f"{name}: {len(queries)} queries for {small} rows, {len(run[name])} for {size}\n"
+                    + _diff(queries, run[name])
+                )
+    return messages
+
+
+def snapshot(recorded, sql=True):
+    return {
+        name: {'queries': len(queries), **({'sql': queries} if sql else {})}
+        for name, queries in sorted(recorded.items())
+    }
+
+
+def compare(recorded, expected):
+    """Return a message for each operation of ``recorded`` that regressed against the ``expected`` snapshot.
+
+    An operation regresses when it runs more queries than its snapshot,
+    when it is missing from the snapshot, or, if the snapshot has the SQL,
+    when that SQL changed.
+    """
+    messages = []
+    for name, queries in sorted(recorded.items()):
+        previous = expected.get(name)
+        if previous is None:
+            messages.append(f"{name}: not in the snapshot")
+        elif len(queries) > previous['queries']:
+            messages.append(f"{name}: {previous['queries']} -> {len(queries)} queries\n" + _diff(
+                previous.get('sql', []), queries
+            ))
+        elif 'sql' in previous and previous['sql'] != queries:
+            messages.append(f"{name}: SQL changed\n" + _diff(previous['sql'], queries))
+    return messages
+
+
+def load(path=SNAPSHOT_PATH):
+    with open(path, encoding='utf-8') as source:
+        return json.load(source)
+
+
+def save(data, path=SNAPSHOT_PATH):
+    with open(path, 'w', encoding='utf-8') as output:
+        json.dump(data, output, indent=2, sort_keys=True)
+        output.write('\n')
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import threading
+import uuid
+import weakref
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from graphql import TypeInfo, TypeInfoVisitor, Visitor, get_named_type, print_ast, visit
+
+DEFAULTS = {
+    'ENABLED': True,
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 300,
+    # "Type.field" names whose presence makes an operation uncacheable
+    'SKIP_FIELDS': (),
+}
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def get_setting(name):
+    return getattr(settings, 'GRAPHQL_RESPONSE_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def get_cache():
+    return caches[get_setting('CACHE_ALIAS')]
+
+
+def get_stats():
+    """Return the hit/miss counters of this process."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.update(hits=0, misses=0)
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _version_key(model):
+    return f'crm:response-cache:version:{model._meta.label_lower}'
+
+
+def invalidate(*models):
+    """Drop every cached response that read any of ``models``.
+
+    Each model has a version token that is part of the key of every response
+    built from it, so replacing the token orphans those entries at once.
+    Call this after writes that bypass model signals (``update()``,
+    ``bulk_create()``).
+    """
+    _bump(models)
+    # A reader between the write and its commit may have cached what it saw
+    # under the new token, so bump again once the write is visible.
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(models))
+
+
+def _bump(models):
+    get_cache().set_many({_version_key(model): uuid.uuid4().hex for model in models}, None)
+
+
+class _DocumentInfo(Visitor):
+    """Collects the models a document reads and whether it may be cached."""
+
+    def __init__(self, type_info, skip_fields):
+        super().__init__()
+        self.type_info = type_info
+        self.skip_fields = skip_fields
+        self.models = set()
+        self.cacheable = True
+
+    def enter_operation_definition(self, node, *_):
+        if node.operation.value != 'query':
+            self.cacheable = False
+
+    def enter_field(self, node, *_):
+        parent = self.type_info.get_parent_type()
+        if parent is not None and f'{parent.name}.{node.name.value}' in self.skip_fields:
+            self.cacheable = False
+        graphene_type = getattr(get_named_type(self.type_info.get_type()), 'graphene_type', None)
+        model = getattr(getattr(graphene_type, '_meta', None), 'model', None)
+        if model is not None:
+            self.models.add(model)
+        # Types computed from models without being one (aggregates) list them
+        self.models.update(getattr(graphene_type, 'source_models', ()))
+
+
+_document_info = weakref.WeakKeyDictionary()
+
+
+def inspect_document(schema, document):
+    """Return ``(normalized_hash, models, cacheable)`` for ``document``.
+
+    Memoized per document, which the persisted-query store keeps alive for
+    hot queries.
+    """
+    info = _document_info.get(document)
+    if info is None:
+        type_info = TypeInfo(schema.graphql_schema)
+        collector = _DocumentInfo(type_info, set(get_setting('SKIP_FIELDS')))
+        visit(document, TypeInfoVisitor(type_info, collector))
+        normalized_hash = hashlib.sha256(print_ast(document).encode('utf-8')).hexdigest()
+        info = (normalized_hash, frozenset(collector.models), collector.cacheable)
+        _document_info[document] = info
+    return info
+
+
+def cache_key(schema, document, operation_name, variables):
+    """Return the cache key for an operation, or ``None`` if it is uncacheable."""
+    if not get_setting('ENABLED'):
+        return None
+    normalized_hash, models, cacheable = inspect_document(schema, document)
+    if not cacheable:
+        return None
+
+    cache = get_cache()
+    version_keys = sorted(_version_key(model) for model in models)
+    versions = cache.get_many(version_keys)
+    for key in version_keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+
+    payload = json.dumps(
+        [normalized_hash, operation_name, variables, [versions[key] for key in version_keys]],
+        sort_keys=True, default=str,
+    )
+    return 'crm:response-cache:result:' + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def lookup(key):
+    data = get_cache().get(key)
+    _count('misses' if data is None else 'hits')
+    return data
+
+
+def store(key, data):
+    get_cache().set(key, data, get_setting('TIMEOUT'))
@@ -0,0 +1,216 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# (low, high) of each crontab field
+FIELD_RANGES = (
+    (0, 59),  # minute
+    (0, 23),  # hour
+    (1, 31),  # day of month
+    (1, 12),  # month
+    (0, 7),   # day of week, 0 and 7 are Sunday
+)
+
+# Give up looking for the next run of a schedule that never fires (Feb 30)
+MAX_LOOKAHEAD = timedelta(days=366 * 5)
+
+
+def _parse_field(spec, low, high):
+    values = set()
+    for part in spec.split(','):
+        expr, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if expr == '*':
+            # A step counts from the field's first value: */2 in day of month
+            # is the 1st, 3rd, 5th...
+            start, end = low, high
+        elif '-' in expr:
+            start, end = (int(value) for value in expr.split('-', 1))
+        else:
+            start = int(expr)
+            end = high if step > 1 else start
+        if not low <= start <= end <= high or step < 1:
+            raise ValueError(f"Invalid crontab field: {spec}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """A five-field crontab expression, evaluated in local wall-clock time."""
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Expected five crontab fields: {expression}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_field(spec, low, high) for spec, (low, high) in zip(fields, FIELD_RANGES)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        # As in cron, a restricted day of month and day of week match either;
+        # a field starting with * (including */N) does not count as restricted
+        self.any_day = fields[2].startswith('*')
+        self.any_weekday = fields[4].startswith('*')
+
+    def day_matches(self, moment):
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment):
+        """Return the first matching minute strictly after the aware ``moment``, in local time.
+
+        A minute skipped when the clocks go forward runs at the same offset
+        from the change (02:30 becomes 03:30), and a minute repeated when
+        they go back runs only the first time.
+        """
+        local = timezone.localtime(moment)
+        tz = local.tzinfo
+        candidate = local.replace(tzinfo=None, second=0, microsecond=0, fold=0) + timedelta(minutes=1)
+        limit = candidate + MAX_LOOKAHEAD
+        while candidate < limit:
+            if candidate.month not in self.months:
+                month = candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)
+                candidate = month.replace(day=1)
+            elif not self.day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                # Compared in UTC: aware datetimes sharing a tzinfo compare
+                # by wall clock, ignoring the offset
+                run = candidate.replace(tzinfo=tz).astimezone(dt_timezone.utc)
+                if run > moment.astimezone(dt_timezone.utc):
+                    return run.astimezone(tz)
+                candidate += timedelta(minutes=1)
+        raise ValueError(f"Schedule never fires: {self.expression}")
+
+
+class Job:
+    """One CRONJOBS entry, with its run lock and timing metrics."""
+
+    def __init__(self, schedule, path, args=(), kwargs=None):
+        self.schedule = CronSchedule(schedule)
+        self.path = path
+        self.func = import_string(path)
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs or {})
+        self.next_run = None
+        self._lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self.metrics = {
+            'runs': 0,
+            'failures': 0,
+            'skipped': 0,
+            'last_duration': None,
+            'max_duration': 0.0,
+            'total_duration': 0.0,
+        }
+
+    @classmethod
+    def from_setting(cls, entry):
+        """Build a job from a django-crontab ``(schedule, path, args, kwargs)`` tuple."""
+        schedule, path, *rest = entry
+        args = rest[0] if len(rest) > 0 else ()
+        kwargs = rest[1] if len(rest) > 1 else None
+        return cls(schedule, path, args, kwargs)
+
+    def run(self):
+        """Run the job unless a previous run is still going; return whether it ran."""
+        if not self._lock.acquire(blocking=False):
+            self._record(skipped=1)
+            logger.warning("Skipping %s: previous run still in progress", self.path)
+            return False
+        started = time.perf_counter()
+        failed = False
+        try:
+            close_old_connections()
+            self.func(*self.args, **self.kwargs)
+        except Exception:
+            failed = True
+            logger.exception("Job %s failed", self.path)
+        finally:
+            close_old_connections()
+            duration = time.perf_counter() - started
+            self._lock.release()
+        self._record(runs=1, failures=int(failed), duration=duration)
+        logger.info("Job %s finished in %.3fs", self.path, duration)
+        return True
+
+    def _record(self, runs=0, failures=0, skipped=0, duration=None):
+        with self._metrics_lock:
+            self.metrics['runs'] += runs
+            self.metrics['failures'] += failures
+            self.metrics['skipped'] += skipped
+            if duration is not None:
+                self.metrics['last_duration'] = duration
+                self.metrics['max_duration'] = max(self.metrics['max_duration'], duration)
+                self.metrics['total_duration'] += duration
+
+    def get_metrics(self):
+        with self._metrics_lock:
+            return dict(self.metrics)
+
+
+class Scheduler:
+    """Runs jobs on a thread pool at their crontab times.
+
+    Each run is delayed by up to ``jitter`` seconds, and less than half the
+    job's interval, so jobs sharing a schedule do not all start on the same
+    tick, and a job whose previous run has not finished is skipped rather
+    than run twice. ``now`` returns aware datetimes.
+    """
+
+    def __init__(self, jobs, max_workers=4, jitter=0, now=timezone.now):
+        self.jobs = list(jobs)
+        self.jitter = jitter
+        self.now = now
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='crm-job')
+        self._stop = threading.Event()
+        start = self.now()
+        for job in self.jobs:
+            self.schedule(job, start)
+
+    def schedule(self, job, after):
+        next_run = job.schedule.next_after(after)
+        # A run delayed past the following one would make it skipped
+        interval = job.schedule.next_after(next_run).astimezone(dt_timezone.utc) - next_run
+        jitter = min(self.jitter, interval.total_seconds() / 2)
+        job.next_run = next_run + timedelta(seconds=random.uniform(0, jitter))
+
+    def run_pending(self):
+        """Submit every job that is due and return the submitted futures."""
+        now = self.now()
+        futures = []
+        for job in self.jobs:
+            if job.next_run <= now:
+                futures.append(self.executor.submit(job.run))
+                self.schedule(job, now)
+        return futures
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            self.run_pending()
+            wait = min(job.next_run for job in self.jobs) - self.now()
+            self._stop.wait(max(wait.total_seconds(), 0))
+
+    def stop(self):
+        """Make ``run_forever`` return; safe to call from a signal handler."""
+        self._stop.set()
+
+    def shutdown(self, wait=True):
+        self.stop()
+        self.executor.shutdown(wait=wait)
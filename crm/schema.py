@@ -1,29 +1,66 @@
 import graphene
 from graphene_django import DjangoObjectType
-from graphene_django.filter import DjangoFilterConnectionField
-from django.db import transaction
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F
 import re
+from collections import Counter, defaultdict
 from .models import Customer, Product, Order
-from crm.models import Product
 from .filters import CustomerFilter, ProductFilter, OrderFilter
+from .loaders import get_loaders
+from .optimizer import optimize
+from .pagination import KeysetConnectionField
+from . import analytics, order_items, response_cache, search, stats
+
+# Simple phone validation (allows +1234567890 or 123-456-7890 format)
+PHONE_PATTERN = re.compile(r'^(\+\d{1,15}|\d{3}-\d{3}-\d{4})$')
+
+# Rows per INSERT / per email lookup in bulk mutations
+BULK_BATCH_SIZE = 500
 
 class CustomerType(DjangoObjectType):
+    # Read from the CustomerStats row, joined in by the optimizer
+    order_count = graphene.Int(required=True)
+    lifetime_value = graphene.Decimal(required=True)
+    last_order_date = graphene.DateTime()
+
     class Meta:
         model = Customer
-        fields = ("id", "name", "email", "phone", "created_at")
-        interfaces = (graphene.relay.Node, )
+        fields = ("id", "name", "email", "phone", "created_at", "order_set")
+
+    def resolve_order_set(self, info):
+        return get_loaders(info).customer_orders.load(self.id)
+
+    def resolve_order_count(self, info):
+        return stats.stats_of(self).order_count
+
+    def resolve_lifetime_value(self, info):
+        return stats.stats_of(self).lifetime_value
+
+    def resolve_last_order_date(self, info):
+        return stats.stats_of(self).last_order_date
 
 class ProductType(DjangoObjectType):
     class Meta:
         model = Product
-        fields = ("id", "name", "price", "stock", "created_at")
-        interfaces = (graphene.relay.Node, )
+        fields = ("id", "name", "price", "stock", "created_at", "order_set")
+
+    def resolve_order_set(self, info):
+        return get_loaders(info).product_orders.load(self.id)
 
 class OrderType(DjangoObjectType):
+    # Declared explicitly so the FK goes through the loader instead of
+    # graphene-django's per-row get_node lookup.
+    customer = graphene.NonNull(CustomerType)
+
     class Meta:
         model = Order
         fields = ("id", "customer", "products", "order_date", "total_amount")
-        interfaces = (graphene.relay.Node, )
+
+    def resolve_customer(self, info):
+        return get_loaders(info).customer_of(self)
+
+    def resolve_products(self, info):
+        return get_loaders(info).products_of(self)
 
 # Input types for mutations
 class CustomerInput(graphene.InputObjectType):
@@ -56,9 +93,7 @@ class CreateCustomer(graphene.Mutation):
 
         # Validate phone format if provided
         if input.phone:
-            # Simple phone validation (allows +1234567890 or 123-456-7890 format)
-            phone_pattern = r'^(\+\d{1,15}|\d{3}-\d{3}-\d{4})$'
-            if not re.match(phone_pattern, input.phone):
+            if not PHONE_PATTERN.match(input.phone):
                 raise Exception("Invalid phone format. Use +1234567890 or 123-456-7890")
 
         customer = Customer(
@@ -77,32 +112,57 @@ class BulkCreateCustomers(graphene.Mutation):
     errors = graphene.List(graphene.String)
 
     def mutate(self, info, input):
-        created_customers = []
         error_messages = []
+        pending = []
+
+        # Look up every email of the batch in one query per chunk instead of
+        # one exists() per row.
+        emails = list({customer_input.email for customer_input in input})
+        taken = set()
+        for start in range(0, len(emails), BULK_BATCH_SIZE):
+            taken.update(Customer.objects.filter(
+                email__in=emails[start:start + BULK_BATCH_SIZE]
+            ).values_list('email', flat=True))
 
         for i, customer_input in enumerate(input):
-            try:
-                # Validate email uniqueness
-                if Customer.objects.filter(email=customer_input.email).exists():
-                    error_messages.append(f"Customer {i+1}: Email already exists")
-                    continue
-
-                # Validate phone format if provided
-                if customer_input.phone:
-                    phone_pattern = r'^(\+\d{1,15}|\d{3}-\d{3}-\d{4})$'
-                    if not re.match(phone_pattern, customer_input.phone):
-                        error_messages.append(f"Customer {i+1}: Invalid phone format")
-                        continue
-
-                customer = Customer(
-                    name=customer_input.name,
-                    email=customer_input.email,
-                    phone=customer_input.phone
-                )
-                customer.save()
-                created_customers.append(customer)
-            except Exception as e:
-                error_messages.append(f"Customer {i+1}: {str(e)}")
+            # Validate email uniqueness, both against the table and the batch
+            if customer_input.email in taken:
+                error_messages.append(f"Customer {i+1}: Email already exists")
+                continue
+
+            # Validate phone format if provided
+            if customer_input.phone and not PHONE_PATTERN.match(customer_input.phone):
+                error_messages.append(f"Customer {i+1}: Invalid phone format")
+                continue
+
+            taken.add(customer_input.email)
+            pending.append((i, Customer(
+                name=customer_input.name,
+                email=customer_input.email,
+                phone=customer_input.phone
+            )))
+
+        customers = [customer for _, customer in pending]
+        try:
+            with transaction.atomic():
+                Customer.objects.bulk_create(customers, batch_size=BULK_BATCH_SIZE)
+                # bulk_create sends no post_save signals
+                search.index(customers)
+                stats.create_for(customers)
+            response_cache.invalidate(Customer)
+            created_customers = customers
+        except IntegrityError:
+            # A concurrent writer took one of the emails; fall back to
+            # row-by-row inserts so the error is reported against that row.
+            created_customers = []
+            for i, customer in pending:
+                customer.pk = None
+                try:
+                    with transaction.atomic():
+                        customer.save()
+                    created_customers.append(customer)
+                except Exception as e:
+                    error_messages.append(f"Customer {i+1}: {str(e)}")
 
         return BulkCreateCustomers(customers=created_customers, errors=error_messages)
 
@@ -147,50 +207,63 @@ class CreateOrder(graphene.Mutation):
         if not input.product_ids:
             raise Exception("At least one product must be selected")
 
-        # Validate all products exist
-        products = []
-        total_amount = 0
+        # Validate all products exist, fetching them in a single query
+        products = {str(p.pk): p for p in Product.objects.filter(id__in=input.product_ids)}
         for product_id in input.product_ids:
-            try:
-                product = Product.objects.get(id=product_id)
-                products.append(product)
-                total_amount += product.price
-            except Product.DoesNotExist:
+            if str(product_id) not in products:
                 raise Exception(f"Invalid product ID: {product_id}")
 
-        # Create order
-        order = Order(
-            customer=customer,
-            total_amount=total_amount
-        )
-        order.save()
-        
-        # Associate products with the order
-        for product in products:
-            order.products.add(product)
-            
-        # Refresh from database to ensure all fields are populated
-        order.refresh_from_db()
+        # A product listed twice is ordered (and charged) twice
+        quantities = Counter(str(product_id) for product_id in input.product_ids)
+
+        with transaction.atomic():
+            # Take stock with one conditional UPDATE per distinct quantity, so
+            # concurrent orders can never both take the last unit.
+            by_quantity = defaultdict(list)
+            for pk, quantity in quantities.items():
+                by_quantity[quantity].append(pk)
+            for quantity, pks in by_quantity.items():
+                updated = Product.objects.filter(id__in=pks, stock__gte=quantity).update(
+                    stock=F('stock') - quantity
+                )
+                if updated != len(pks):
+                    raise Exception("Insufficient stock for one or more products")
+            response_cache.invalidate(Product)
+
+            # The total is summed from the lines in SQL once they exist
+            order = Order(customer=customer)
+            order.save()
+            order_items.add_items(order, {products[pk]: quantity for pk, quantity in quantities.items()})
+
         return CreateOrder(order=order)
 
 class UpdateLowStockProducts(graphene.Mutation):
     class Arguments:
-        pass
+        threshold = graphene.Int(default_value=10)
+        increment = graphene.Int(default_value=10)
     
     success = graphene.Boolean()
     message = graphene.String()
     updated_products = graphene.List(ProductType)
     
-    def mutate(self, info):
-        # Find products with stock < 10
-        low_stock_products = Product.objects.filter(stock__lt=10)
-        updated_products = []
-        
-        for product in low_stock_products:
-            product.stock += 10  # Increment stock by 10
-            product.save()
-            updated_products.append(product)
-        
+    def mutate(self, info, threshold=10, increment=10):
+        if increment <= 0:
+            raise Exception("Increment must be positive")
+
+        # Restock every product below the threshold with a single
+        # UPDATE ... SET stock = stock + increment ... RETURNING (SQLite 3.35+,
+        # PostgreSQL): the rows written are the rows returned, without
+        # selecting them first or binding their ids
+        table = Product._meta.db_table
+        quote = connection.ops.quote_name
+        # raw() converts the returned columns as a SELECT would
+        updated_products = list(Product.objects.raw(
+            f'UPDATE {quote(table)} SET {quote("stock")} = {quote("stock")} + %s WHERE {quote("stock")} < %s '
+            f'RETURNING {", ".join(quote(field.column) for field in Product._meta.concrete_fields)}',
+            [increment, threshold],
+        ))
+        response_cache.invalidate(Product)
+
         return UpdateLowStockProducts(
             success=True,
             message=f"Updated {len(updated_products)} low-stock products",
@@ -206,18 +279,36 @@ class Mutation(graphene.ObjectType):
 
 class Query(graphene.ObjectType):
     hello = graphene.String()
-    all_customers = DjangoFilterConnectionField(CustomerType, filterset_class=CustomerFilter)
-    all_products = DjangoFilterConnectionField(ProductType, filterset_class=ProductFilter)
-    all_orders = DjangoFilterConnectionField(OrderType, filterset_class=OrderFilter)
+    customers = graphene.List(CustomerType)
+    products = graphene.List(ProductType)
+    orders = graphene.List(OrderType, order_date_gte=graphene.DateTime())
+    # Filtered, keyset-paginated connections over the same types
+    all_customers = KeysetConnectionField(CustomerType, filterset_class=CustomerFilter, order_key='created_at')
+    all_products = KeysetConnectionField(ProductType, filterset_class=ProductFilter, order_key='created_at')
+    all_orders = KeysetConnectionField(OrderType, filterset_class=OrderFilter, order_key='order_date')
+    # Totals computed in SQL, instead of summing orders on the client
+    order_stats = analytics.order_stats_field(OrderType)
     
     def resolve_hello(self, info):
         return "Hello, GraphQL!"
+
+    def resolve_customers(self, info):
+        return get_loaders(info).resolve_list(optimize(Customer.objects.all(), info))
+
+    def resolve_products(self, info):
+        return get_loaders(info).resolve_list(optimize(Product.objects.all(), info))
+
+    def resolve_orders(self, info, order_date_gte=None):
+        queryset = Order.objects.all()
+        if order_date_gte:
+            queryset = queryset.filter(order_date__gte=order_date_gte)
+        return get_loaders(info).resolve_list(optimize(queryset, info))
         
     def resolve_all_customers(self, info, **kwargs):
-        return Customer.objects.all()
+        return optimize(Customer.objects.all(), info)
         
     def resolve_all_products(self, info, **kwargs):
-        return Product.objects.all()
+        return optimize(Product.objects.all(), info)
         
     def resolve_all_orders(self, info, **kwargs):
-        return Order.objects.all()
\ No newline at end of file
+        return optimize(Order.objects.all(), info)
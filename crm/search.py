@@ -0,0 +1,209 @@
+from django.db import connection
+from django.db.models import OuterRef, Q, Subquery
+from django.db.models.expressions import RawSQL
+
+from .models import Customer, Product, Order
+
+# Text columns covered by the search index, per model
+SEARCH_FIELDS = {
+    Customer: ('name', 'email'),
+    Product: ('name',),
+}
+
+# Trigram indexes cannot match anything shorter than one trigram
+MIN_QUERY_LENGTH = 3
+
+# Rows per statement when syncing the index; keeps parameters under SQLite's limit
+CHUNK_SIZE = 200
+
+
+def search_table(model):
+    return f'{model._meta.db_table}_search'
+
+
+class LikeBackend:
+    """Fallback for databases without a substring index: plain icontains."""
+
+    def filter(self, queryset, value, fields):
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__icontains': value})
+        return queryset.filter(condition)
+
+    def rank(self, queryset, value, fields):
+        return queryset
+
+    def rank_orders(self, queryset, value):
+        return queryset
+
+    def index(self, instances):
+        pass
+
+    def remove(self, model, pks):
+        pass
+
+    def rebuild(self, model):
+        pass
+
+
+class SQLiteFTSBackend(LikeBackend):
+    """FTS5 tables with the trigram tokenizer, kept in sync by crm.signals.
+
+    The trigram tokenizer matches case-insensitive substrings, so results are
+    the same as ``icontains`` but come from the index instead of a
+    ``LIKE '%x%'`` scan. ``rank`` is FTS5's bm25 score, lower is better.
+    """
+
+    def match(self, value, fields):
+        phrase = '"{}"'.format(value.replace('"', '""'))
+        return '{%s} : %s' % (' '.join(fields), phrase)
+
+    def filter(self, queryset, value, fields):
+        if len(value) < MIN_QUERY_LENGTH:
+            return super().filter(queryset, value, fields)
+        table = search_table(queryset.model)
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [self.match(value, fields)]
+        ))
+
+    def rank(self, queryset, value, fields):
+        if len(value) < MIN_QUERY_LENGTH:
+            return queryset
+        model = queryset.model
+        table = search_table(model)
+        pk = f'"{model._meta.db_table}"."{model._meta.pk.column}"'
+        return queryset.annotate(search_rank=RawSQL(
+            f'SELECT rank FROM {table} WHERE {table} MATCH %s AND rowid = {pk}',
+            [self.match(value, fields)],
+        ))
+
+    def rank_orders(self, queryset, value):
+        # The best rank of the order's customer and of its products
+        if len(value) < MIN_QUERY_LENGTH:
+            return queryset
+        customers = search_table(Customer)
+        products = search_table(Product)
+        items = Order.products.through._meta.db_table
+        order = f'"{Order._meta.db_table}"'
+        return queryset.annotate(search_rank=RawSQL(
+            f'SELECT MIN(rank) FROM ('
+            f'SELECT rank FROM {customers} WHERE {customers} MATCH %s AND rowid = {order}."customer_id" '
+            f'UNION ALL SELECT {products}.rank FROM {products} JOIN {items} ON {items}.product_id = {products}.rowid '
+            f'WHERE {products} MATCH %s AND {items}.order_id = {order}."id")',
+            [self.match(value, SEARCH_FIELDS[Customer]), self.match(value, SEARCH_FIELDS[Product])],
+        ))
+
+    def index(self, instances):
+        by_model = {}
+        for instance in instances:
+            by_model.setdefault(type(instance), []).append(instance)
+        for model, group in by_model.items():
+            fields = SEARCH_FIELDS[model]
+            table = search_table(model)
+            self.remove(model, [instance.pk for instance in group])
+            row = '({})'.format(', '.join(['%s'] * (len(fields) + 1)))
+            with connection.cursor() as cursor:
+                for start in range(0, len(group), CHUNK_SIZE):
+                    chunk = group[start:start + CHUNK_SIZE]
+                    cursor.execute(
+                        f'INSERT INTO {table} (rowid, {", ".join(fields)}) VALUES '
+                        + ', '.join([row] * len(chunk)),
+                        [value for instance in chunk
+                         for value in [instance.pk] + [getattr(instance, f) or '' for f in fields]],
+                    )
+
+    def remove(self, model, pks):
+        table = search_table(model)
+        with connection.cursor() as cursor:
+            for start in range(0, len(pks), CHUNK_SIZE):
+                chunk = pks[start:start + CHUNK_SIZE]
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE rowid IN ({", ".join(["%s"] * len(chunk))})', chunk
+                )
+
+    def rebuild(self, model):
+        fields = SEARCH_FIELDS[model]
+        table = search_table(model)
+        columns = ', '.join(fields)
+        values = ', '.join(f"COALESCE({f}, '')" for f in fields)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table}')
+            cursor.execute(
+                f'INSERT INTO {table} (rowid, {columns}) '
+                f'SELECT {model._meta.pk.column}, {values} FROM {model._meta.db_table}'
+            )
+
+
+class TrigramBackend(LikeBackend):
+    """PostgreSQL: pg_trgm GIN indexes serve icontains directly.
+
+    The indexes are maintained by PostgreSQL itself; ranking uses word
+    similarity, negated so that lower is better as with FTS5.
+    """
+
+    def rank(self, queryset, value, fields):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        from django.db.models.functions import Greatest
+
+        similarities = [TrigramWordSimilarity(value, field) for field in fields]
+        best = similarities[0] if len(similarities) == 1 else Greatest(*similarities)
+        return queryset.annotate(search_rank=-best)
+
+    def rank_orders(self, queryset, value):
+        from django.db.models.functions import Least
+
+        # LEAST ignores the NULL of an order without products
+        customer = self.rank(Customer.objects.filter(pk=OuterRef('customer_id')), value, SEARCH_FIELDS[Customer])
+        products = self.rank(Product.objects.filter(order=OuterRef('pk')), value, SEARCH_FIELDS[Product])
+        return queryset.annotate(search_rank=Least(
+            Subquery(customer.values('search_rank')[:1]),
+            Subquery(products.order_by('search_rank').values('search_rank')[:1]),
+        ))
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': TrigramBackend,
+}
+
+
+def get_backend():
+    return BACKENDS.get(connection.vendor, LikeBackend)()
+
+
+def filter_text(queryset, value, fields=None):
+    """Equivalent of ``icontains`` on ``fields``, resolved through the search index."""
+    return get_backend().filter(queryset, value, fields or SEARCH_FIELDS[queryset.model])
+
+
+def search(queryset, value):
+    """Filter ``queryset`` to rows matching ``value`` and rank them.
+
+    Rows get a ``search_rank`` annotation (lower is better) when the backend
+    ranks. Orders match on their customer or any of their products, through
+    the customer and product indexes, without duplicating rows, and rank as
+    their best match.
+    """
+    backend = get_backend()
+    if queryset.model is Order:
+        customers = backend.filter(Customer.objects.all(), value, SEARCH_FIELDS[Customer])
+        products = backend.filter(Product.objects.all(), value, SEARCH_FIELDS[Product])
+        matches = queryset.filter(
+            Q(customer__in=customers.values('pk'))
+            | Q(pk__in=Order.products.through.objects.filter(product__in=products.values('pk')).values('order_id'))
+        )
+        return backend.rank_orders(matches, value)
+    fields = SEARCH_FIELDS[queryset.model]
+    return backend.rank(backend.filter(queryset, value, fields), value, fields)
+
+
+def index(instances):
+    get_backend().index(instances)
+
+
+def remove(model, pks):
+    get_backend().remove(model, pks)
+
+
+def rebuild(model):
+    get_backend().rebuild(model)
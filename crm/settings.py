@@ -8,19 +8,15 @@ def log_crm_heartbeat():
     
     try:
         # Optionally query GraphQL hello field to verify endpoint is responsive
-        from gql import gql, Client
-        from gql.transport.requests import RequestsHTTPTransport
+        from crm import graphql_client
         
-        transport = RequestsHTTPTransport(url="http://localhost:8000/graphql/")
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-        
-        query = gql("""
+        query = """
             query {
                 hello
             }
-        """)
+        """
         
-        result = client.execute(query)
+        result = graphql_client.execute(query)
         if result.get('hello'):
             heartbeat_msg += " - GraphQL endpoint responsive"
         
@@ -35,15 +31,10 @@ def update_low_stock():
     """Execute UpdateLowStockProducts mutation and log updates."""
     
     try:
-        from gql import gql, Client
-        from gql.transport.requests import RequestsHTTPTransport
-        
-        # Setup GraphQL client
-        transport = RequestsHTTPTransport(url="http://localhost:8000/graphql/")
-        client = Client(transport=transport, fetch_schema_from_transport=True)
+        from crm import graphql_client
         
         # Execute the mutation
-        mutation = gql("""
+        mutation = """
             mutation {
                 updateLowStockProducts {
                     success
@@ -55,9 +46,9 @@ def update_low_stock():
                     }
                 }
             }
-        """)
+        """
         
-        result = client.execute(mutation)
+        result = graphql_client.execute(mutation)
         
         # Log the results
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
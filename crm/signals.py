@@ -0,0 +1,95 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Customer, Product, Order, OrderItem
+from . import database, order_items, profiling, response_cache, search, stats
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_model_responses(sender, **kwargs):
+    response_cache.invalidate(sender)
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def invalidate_order_products_responses(sender, **kwargs):
+    response_cache.invalidate(Order, Product)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+def index_for_search(sender, instance, **kwargs):
+    search.index([instance])
+
+
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Product)
+def remove_from_search(sender, instance, **kwargs):
+    search.remove(sender, [instance.pk])
+
+
+@receiver(post_save, sender=Customer)
+def create_customer_stats(sender, instance, created, **kwargs):
+    if created:
+        stats.create_for([instance])
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_customer(sender, instance, **kwargs):
+    # An order moved to another customer changes the stats of both
+    if not instance._state.adding:
+        instance._previous_customer_id = (
+            Order.objects.filter(pk=instance.pk).values_list('customer_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Order)
+def update_customer_stats(sender, instance, created, **kwargs):
+    if created:
+        stats.add_order(instance)
+    else:
+        customer_ids = {instance.customer_id, getattr(instance, '_previous_customer_id', None)}
+        stats.refresh(customer_ids - {None})
+
+
+@receiver(post_delete, sender=Order)
+def remove_order_from_stats(sender, instance, **kwargs):
+    stats.refresh([instance.customer_id])
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def update_totals_of_changed_orders(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # Which orders lose the product is unknown once the rows are gone
+        instance._cleared_order_ids = list(instance.order_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            order_ids = [instance.pk]
+        elif action == 'post_clear':
+            order_ids = instance.__dict__.pop('_cleared_order_ids', [])
+        else:
+            order_ids = pk_set
+        order_items.update_totals(order_ids)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def update_order_total(sender, instance, origin=None, **kwargs):
+    # Lines deleted along with their order or customer leave no total to fix
+    if getattr(origin, 'model', type(origin)) not in (Order, Customer):
+        order_items.update_totals([instance.order_id])
+
+
+@receiver(connection_created)
+def install_query_profiler(sender, connection, **kwargs):
+    profiling.install(connection)
+
+
+@receiver(connection_created)
+def tune_database(sender, connection, **kwargs):
+    database.tune(connection)
@@ -0,0 +1,74 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Count, DateTimeField, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Customer, CustomerStats, Order
+from . import response_cache
+
+# Sort value of customers that never ordered, when sorting by last_order_date
+NEVER = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+SORT_DEFAULTS = {
+    'order_count': 0,
+    'lifetime_value': Decimal('0'),
+    'last_order_date': NEVER,
+}
+
+REBUILD_SQL = (
+    'INSERT INTO crm_customerstats (customer_id, order_count, lifetime_value, last_order_date) '
+    'SELECT c.id, COUNT(o.id), COALESCE(SUM(o.total_amount), 0), MAX(o.order_date) '
+    'FROM crm_customer c LEFT JOIN crm_order o ON o.customer_id = c.id GROUP BY c.id'
+)
+
+
+def stats_of(customer):
+    """Return the stats of ``customer``, or empty ones if it has no row yet."""
+    try:
+        return customer.stats
+    except CustomerStats.DoesNotExist:
+        return CustomerStats(customer=customer)
+
+
+def create_for(customers):
+    """Add empty stats rows for newly created ``customers``."""
+    CustomerStats.objects.bulk_create(
+        [CustomerStats(customer_id=customer.pk) for customer in customers], ignore_conflicts=True
+    )
+
+
+def add_order(order):
+    """Count a new order in its customer's stats with a single UPDATE."""
+    placed = Value(order.order_date, output_field=DateTimeField())
+    updated = CustomerStats.objects.filter(customer_id=order.customer_id).update(
+        order_count=F('order_count') + 1,
+        lifetime_value=F('lifetime_value') + order.total_amount,
+        last_order_date=Greatest(Coalesce('last_order_date', placed), placed),
+    )
+    if not updated:
+        create_for([Customer(pk=order.customer_id)])
+        refresh([order.customer_id])
+    response_cache.invalidate(Customer)
+
+
+def refresh(customer_ids):
+    """Recompute the existing stats rows of ``customer_ids`` from their orders."""
+    orders = Order.objects.filter(customer=OuterRef('customer_id')).order_by().values('customer')
+    CustomerStats.objects.filter(customer_id__in=customer_ids).update(
+        order_count=Coalesce(Subquery(orders.annotate(n=Count('pk')).values('n')), 0),
+        lifetime_value=Coalesce(
+            Subquery(orders.annotate(total=Sum('total_amount')).values('total')), Value(Decimal('0'))
+        ),
+        last_order_date=Subquery(orders.annotate(last=Max('order_date')).values('last')),
+    )
+    response_cache.invalidate(Customer)
+
+
+def rebuild():
+    """Recompute every customer's stats with one aggregate query."""
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM crm_customerstats')
+        cursor.execute(REBUILD_SQL)
+    response_cache.invalidate(Customer)
@@ -1,3 +1,1317 @@
-from django.test import TestCase
+import contextlib
+import importlib
+import io
+import json
+import sqlite3
+import tempfile
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from graphene.utils.str_converters import to_camel_case
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from .models import Customer, CustomerStats, Product, Order, OrderItem
+from .filters import CustomerFilter, ProductFilter, OrderFilter
+from . import benchmark, complexity, database, export, graphql_client, persisted_queries, profiling, response_cache
+from . import pagination, query_counts, search
+from . import schema as crm_schema
+from .persisted_queries import DocumentStore, get_document_store, query_hash
+
+schema = importlib.import_module('alx-backend-graphql_crm.schema').schema
+
+
+def make_orders(count, products_per_order=2):
+    products = [Product.objects.create(name=f"Product {i}", price=10 + i, stock=5) for i in range(4)]
+    for i in range(count):
+        customer = Customer.objects.create(name=f"Customer {i}", email=f"customer{i}@example.com")
+        order = Order.objects.create(customer=customer)
+        order.products.add(*products[:products_per_order], through_defaults={'unit_price': 10})
+
+
+class GraphQLTestCase(TestCase):
+    def execute(self, schema, query, **kwargs):
+        result = schema.execute(query, context_value=RequestFactory().post('/graphql/'), **kwargs)
+        self.assertIsNone(result.errors)
+        return result.data
+
+
+class LoaderBatchingTests(GraphQLTestCase):
+    ROOT_QUERY = '{ orders { customer { email } products { name } } }'
+    RELAY_QUERY = '''
+        { allOrders { edges { node {
+            customer { email }
+            products { name }
+        } } } }
+    '''
+
+    def test_root_orders_batch_nested_fields(self):
+        make_orders(10)
+        # orders joined to customers, products prefetch
+        with self.assertNumQueries(2):
+            data = self.execute(schema, self.ROOT_QUERY)
+        self.assertEqual(len(data['orders']), 10)
+        self.assertEqual(data['orders'][3]['customer']['email'], 'customer3@example.com')
+        self.assertEqual([p['name'] for p in data['orders'][0]['products']], ['Product 0', 'Product 1'])
+
+    def test_relay_orders_batch_nested_fields(self):
+        make_orders(10)
+        # orders joined to customers, products prefetch
+        with self.assertNumQueries(2):
+            data = self.execute(schema, self.RELAY_QUERY)
+        edges = data['allOrders']['edges']
+        self.assertEqual(len(edges), 10)
+        self.assertEqual(len(edges[0]['node']['products']), 2)
+
+    def test_reverse_relations_batch(self):
+        make_orders(5)
+        query = '{ customers { orderSet { products { orderSet { id } } } } }'
+        # customers, orders, products, product orders
+        with self.assertNumQueries(4):
+            data = self.execute(schema, query)
+        self.assertEqual(len(data['customers'][0]['orderSet'][0]['products'][0]['orderSet']), 5)
+
+
+class OptimizerTests(GraphQLTestCase):
+    def capture(self, schema, query):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.execute(schema, query)
+        return data, [q['sql'] for q in ctx.captured_queries]
+
+    def test_only_selected_columns_are_fetched(self):
+        make_orders(3)
+        data, queries = self.capture(schema, '{ orders { totalAmount customer { email } products { name } } }')
+        self.assertEqual(len(queries), 2)
+        self.assertIn('"crm_customer"."email"', queries[0])
+        self.assertNotIn('"crm_customer"."phone"', queries[0])
+        self.assertNotIn('"crm_order"."order_date"', queries[0])
+        self.assertNotIn('"crm_product"."price"', queries[1])
+        self.assertEqual(data['orders'][1]['customer']['email'], 'customer1@example.com')
+
+    def test_fragments_and_relay_edges_are_followed(self):
+        make_orders(3)
+        query = """
+            query { allOrders { edges { node { ...OrderFields } } } }
+            fragment OrderFields on OrderType {
+                ... on OrderType { customer { name } }
+                products { price }
+            }
+        """
+        data, queries = self.capture(schema, query)
+        self.assertEqual(len(queries), 2)
+        self.assertIn('"crm_customer"."name"', queries[0])
+        self.assertNotIn('"crm_order"."total_amount"', queries[0])
+        self.assertIn('"crm_product"."price"', queries[1])
+        self.assertNotIn('"crm_product"."name"', queries[1])
+        self.assertEqual(data['allOrders']['edges'][2]['node']['customer']['name'], 'Customer 2')
+
+
+class BulkCreateCustomersTests(GraphQLTestCase):
+    MUTATION = '''
+        mutation($input: [CustomerInput]!) {
+            bulkCreateCustomers(input: $input) { customers { id email } errors }
+        }
+    '''
+
+    def run_bulk(self, rows):
+        return self.execute(schema, self.MUTATION, variables={'input': rows})['bulkCreateCustomers']
+
+    def test_reports_per_row_errors_and_creates_the_rest(self):
+        Customer.objects.create(name="Existing", email="taken@example.com")
+        result = self.run_bulk([
+            {'name': 'A', 'email': 'a@example.com', 'phone': '+1234567890'},
+            {'name': 'B', 'email': 'taken@example.com'},
+            {'name': 'C', 'email': 'c@example.com', 'phone': 'not-a-phone'},
+            {'name': 'D', 'email': 'a@example.com'},
+            {'name': 'E', 'email': 'e@example.com', 'phone': '123-456-7890'},
+        ])
+        self.assertEqual(result['errors'], [
+            "Customer 2: Email already exists",
+            "Customer 3: Invalid phone format",
+            "Customer 4: Email already exists",
+        ])
+        self.assertEqual([c['email'] for c in result['customers']], ['a@example.com', 'e@example.com'])
+        self.assertTrue(all(c['id'] for c in result['customers']))
+        self.assertEqual(Customer.objects.count(), 3)
+
+    def test_query_count_does_not_grow_with_batch(self):
+        rows = [{'name': f'N{i}', 'email': f'n{i}@example.com'} for i in range(200)]
+        # email lookup, savepoint, insert, search index delete + insert, release
+        with self.assertNumQueries(7):
+            result = self.run_bulk(rows)
+        self.assertEqual(len(result['customers']), 200)
+
+
+class CreateOrderTests(GraphQLTestCase):
+    MUTATION = '''
+        mutation($input: OrderInput!) {
+            createOrder(input: $input) { order { totalAmount customer { email } products { name } } }
+        }
+    '''
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Buyer", email="buyer@example.com")
+        self.pen = Product.objects.create(name="Pen", price=2, stock=5)
+        self.ink = Product.objects.create(name="Ink", price=7, stock=1)
+
+    def create_order(self, product_ids):
+        variables = {'input': {'customerId': self.customer.pk, 'productIds': product_ids}}
+        return schema.execute(self.MUTATION, variables=variables, context_value=RequestFactory().post('/graphql/'))
+
+    def test_creates_order_and_takes_stock(self):
+        result = self.create_order([self.pen.pk, self.pen.pk, self.ink.pk])
+        self.assertIsNone(result.errors)
+        order = result.data['createOrder']['order']
+        self.assertEqual(order['totalAmount'], '11.00')
+        self.assertEqual(len(order['products']), 2)
+        self.pen.refresh_from_db()
+        self.ink.refresh_from_db()
+        self.assertEqual((self.pen.stock, self.ink.stock), (3, 0))
+        item = OrderItem.objects.get(product=self.pen)
+        self.assertEqual((item.quantity, item.unit_price), (2, 2))
+        self.assertEqual(CustomerStats.objects.get(customer=self.customer).lifetime_value, 11)
+
+    def test_insufficient_stock_rolls_back(self):
+        result = self.create_order([self.pen.pk, self.ink.pk, self.ink.pk])
+        self.assertIn("Insufficient stock", str(result.errors[0]))
+        self.assertFalse(Order.objects.exists())
+        self.pen.refresh_from_db()
+        self.assertEqual(self.pen.stock, 5)
+
+    def test_invalid_product(self):
+        result = self.create_order([self.pen.pk, 9999])
+        self.assertEqual(str(result.errors[0].message), "Invalid product ID: 9999")
+
+    def test_query_count_does_not_grow_with_products(self):
+        products = [Product.objects.create(name=f"P{i}", price=1, stock=1) for i in range(20)]
+        mutation = 'mutation($input: OrderInput!) { createOrder(input: $input) { order { id } } }'
+        variables = {'input': {'customerId': self.customer.pk, 'productIds': [p.pk for p in products]}}
+        # customer, products, savepoint, stock update, order insert, stats
+        # update, line insert, total update, stats refresh, release
+        with self.assertNumQueries(10):
+            self.execute(schema, mutation, variables=variables)
+
+
+class UpdateLowStockProductsTests(GraphQLTestCase):
+    MUTATION = '''
+        mutation { updateLowStockProducts%s { success message updatedProducts { name stock } } }
+    '''
+
+    def setUp(self):
+        for name, stock in [("Low", 2), ("Edge", 9), ("Fine", 10), ("Empty", 0)]:
+            Product.objects.create(name=name, price=1, stock=stock)
+
+    def test_restocks_with_defaults(self):
+        stock_before = dict(Product.objects.values_list('name', 'stock'))
+        # One UPDATE ... RETURNING
+        with self.assertNumQueries(1):
+            data = self.execute(schema, self.MUTATION % '')['updateLowStockProducts']
+        updated = {p['name']: p['stock'] for p in data['updatedProducts']}
+        expected = {name: stock + 10 for name, stock in stock_before.items() if stock < 10}
+        self.assertEqual(updated, expected)
+        self.assertEqual(dict(Product.objects.filter(name__in=expected).values_list('name', 'stock')), expected)
+
+    def test_threshold_and_increment_arguments(self):
+        data = self.execute(schema, self.MUTATION % '(threshold: 5, increment: 3)')['updateLowStockProducts']
+        self.assertEqual(data['message'], "Updated 2 low-stock products")
+        self.assertEqual(sorted(p['stock'] for p in data['updatedProducts']), [3, 5])
+        self.assertEqual(Product.objects.get(name="Edge").stock, 9)
+
+
+class GraphQLViewTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        response_cache.reset_stats()
+
+    def post(self, body):
+        response = self.client.post('/graphql/', json.dumps(body), content_type='application/json')
+        return response.json()
+
+
+class SchemaTests(GraphQLViewTestCase):
+    def test_connections_and_root_fields_are_served_together(self):
+        make_orders(3)
+        result = self.post({'query': '''
+            { customers { email orderSet { id } }
+              allOrders(first: 2) { edges { node { customer { email } products { name } } } } }
+        '''})
+        self.assertNotIn('errors', result)
+        self.assertEqual(len(result['data']['customers']), 3)
+        self.assertEqual(len(result['data']['allOrders']['edges'][0]['node']['products']), 2)
+
+    def test_connection_classes_are_built_on_first_use(self):
+        self.assertIsNone(crm_schema.OrderType._meta.connection)
+        connection = pagination.connection_for(crm_schema.OrderType)
+        self.assertIs(pagination.connection_for(crm_schema.OrderType), connection)
+        self.assertIs(schema.graphql_schema.get_type('OrderTypeConnection').graphene_type, connection)
+        # Relations of the node types stay lists
+        self.assertEqual(str(schema.graphql_schema.get_type('OrderType').fields['products'].type), '[ProductType!]!')
+
+
+class PersistedQueryTests(GraphQLViewTestCase):
+    QUERY = '{ products { name } }'
+
+    def apq(self, sha256):
+        return {'persistedQuery': {'version': 1, 'sha256Hash': sha256}}
+
+    def test_hash_only_miss_then_register_then_hit(self):
+        Product.objects.create(name="Pen", price=1)
+        sha256 = query_hash(self.QUERY)
+        miss = self.post({'extensions': self.apq(sha256)})
+        self.assertEqual(miss['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_NOT_FOUND')
+
+        full = self.post({'query': self.QUERY, 'extensions': self.apq(sha256)})
+        self.assertEqual(full['data'], {'products': [{'name': 'Pen'}]})
+
+        with mock.patch.object(persisted_queries, 'parse') as parse:
+            hit = self.post({'extensions': self.apq(sha256)})
+        parse.assert_not_called()
+        self.assertEqual(hit['data'], full['data'])
+
+    def test_registered_operations_are_precompiled(self):
+        # The registry stores the heartbeat query; gql sends it printed
+        from graphql import parse, print_ast
+        sha256 = query_hash(print_ast(parse('query {\n    hello\n}')))
+        self.assertEqual(self.post({'extensions': self.apq(sha256)})['data'], {'hello': 'Hello, GraphQL!'})
+
+    def test_hash_mismatch_is_rejected(self):
+        result = self.post({'query': self.QUERY, 'extensions': self.apq('0' * 64)})
+        self.assertIn('does not match', result['errors'][0]['message'])
+
+    def test_malformed_extensions_are_a_bad_request(self):
+        for extensions in (['persistedQuery'], '"persistedQuery"', '[1]', {'persistedQuery': 'abc'}):
+            response = self.client.post(
+                '/graphql/', json.dumps({'query': self.QUERY, 'extensions': extensions}),
+                content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 400, extensions)
+            self.assertIn('must be a JSON object', response.json()['errors'][0]['message'])
+        response = self.client.get('/graphql/', {'query': self.QUERY, 'extensions': '[]'},
+                                   HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_only_registered(self):
+        with self.settings(GRAPHQL_PERSISTED_QUERIES={'ONLY_REGISTERED': True}):
+            result = self.post({'query': self.QUERY})
+        self.assertIn('Only registered', result['errors'][0]['message'])
+
+    def test_lru_evicts_least_recently_used(self):
+        store = DocumentStore(schema, cache_size=2)
+        for query in ['{ hello }', '{ products { id } }', '{ customers { id } }']:
+            document, errors = store.document_for(query)
+            self.assertEqual(errors, [])
+        self.assertEqual(len(store), 2)
+        self.assertIsNone(store.get(query_hash('{ hello }')))
+        self.assertIsNotNone(store.get(query_hash('{ customers { id } }')))
+
+    def test_invalid_documents_are_not_cached(self):
+        store = get_document_store(schema)
+        document, errors = store.document_for('{ nope }')
+        self.assertTrue(errors)
+        self.assertIsNone(store.get(query_hash('{ nope }')))
+
+
+class ResponseCacheTests(GraphQLViewTestCase):
+    PRODUCTS = '{ products { name stock } }'
+    ORDERS = '{ orders { products { name } } }'
+
+    def setUp(self):
+        super().setUp()
+        make_orders(2, products_per_order=1)
+
+    def test_repeated_query_is_served_from_cache(self):
+        first = self.post({'query': self.PRODUCTS})
+        with self.assertNumQueries(0):
+            second = self.post({'query': '{products{name stock}}'})
+        self.assertEqual(first, second)
+        self.assertEqual(response_cache.get_stats(), {'hits': 1, 'misses': 1})
+
+    def test_variables_are_part_of_the_key(self):
+        query = 'query($gte: DateTime) { orders(orderDateGte: $gte) { id } }'
+        self.post({'query': query, 'variables': {'gte': '2000-01-01T00:00:00Z'}})
+        result = self.post({'query': query, 'variables': {'gte': '2999-01-01T00:00:00Z'}})
+        self.assertEqual(result['data']['orders'], [])
+        self.assertEqual(response_cache.get_stats()['hits'], 0)
+
+    def test_model_signals_invalidate_precisely(self):
+        self.post({'query': self.PRODUCTS})
+        Customer.objects.create(name="Unrelated", email="unrelated@example.com")
+        self.post({'query': self.PRODUCTS})
+        self.assertEqual(response_cache.get_stats()['hits'], 1)
+
+        Product.objects.create(name="New", price=1)
+        result = self.post({'query': self.PRODUCTS})
+        self.assertIn({'name': 'New', 'stock': 0}, result['data']['products'])
+
+    def test_m2m_changes_invalidate_orders(self):
+        self.post({'query': self.ORDERS})
+        Order.objects.first().products.add(Product.objects.last(), through_defaults={'unit_price': 1})
+        result = self.post({'query': self.ORDERS})
+        self.assertEqual(len(result['data']['orders'][0]['products']), 2)
+        self.assertEqual(response_cache.get_stats()['hits'], 0)
+
+    def test_bulk_updates_invalidate(self):
+        self.post({'query': self.PRODUCTS})
+        self.post({'query': 'mutation { updateLowStockProducts { success } }'})
+        result = self.post({'query': self.PRODUCTS})
+        self.assertEqual({p['stock'] for p in result['data']['products']}, {15})
+
+    def test_skip_fields_opt_out(self):
+        query = '{ hello products { id } }'
+        with self.settings(GRAPHQL_RESPONSE_CACHE={'SKIP_FIELDS': ['Query.hello']}):
+            self.post({'query': query})
+            self.post({'query': query})
+        self.assertEqual(response_cache.get_stats(), {'hits': 0, 'misses': 0})
+
+
+class KeysetPaginationTests(GraphQLTestCase):
+    PAGE = '''
+        query($first: Int, $after: String, $last: Int, $before: String) {
+            allOrders(first: $first, after: $after, last: $last, before: $before) {
+                edges { node { totalAmount } }
+                pageInfo { hasNextPage hasPreviousPage startCursor endCursor }
+            }
+        }
+    '''
+
+    def setUp(self):
+        make_orders(7)
+        # Same order_date for some rows, so the id tie-breaker matters
+        Order.objects.filter(pk__in=[2, 3, 4]).update(order_date=Order.objects.get(pk=2).order_date)
+        for order in Order.objects.all():
+            Order.objects.filter(pk=order.pk).update(total_amount=order.pk)
+
+    def page(self, **variables):
+        return self.execute(schema, self.PAGE, variables=variables)['allOrders']
+
+    def amounts(self, page):
+        return [int(float(edge['node']['totalAmount'])) for edge in page['edges']]
+
+    def test_forward_pagination_walks_every_row_once(self):
+        seen, after = [], None
+        while True:
+            page = self.page(first=3, after=after)
+            seen += self.amounts(page)
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        self.assertEqual(seen, [1, 2, 3, 4, 5, 6, 7])
+
+    def test_backward_pagination(self):
+        page = self.page(last=3)
+        self.assertEqual(self.amounts(page), [5, 6, 7])
+        self.assertTrue(page['pageInfo']['hasPreviousPage'])
+        page = self.page(last=3, before=page['pageInfo']['startCursor'])
+        self.assertEqual(self.amounts(page), [2, 3, 4])
+
+    def test_first_and_last_take_the_end_of_the_first_slice(self):
+        page = self.page(first=5, last=2)
+        self.assertEqual(self.amounts(page), [4, 5])
+        self.assertTrue(page['pageInfo']['hasNextPage'])
+        self.assertTrue(page['pageInfo']['hasPreviousPage'])
+        page = self.page(first=3, last=5, after=self.page(first=4)['pageInfo']['endCursor'])
+        self.assertEqual(self.amounts(page), [5, 6, 7])
+        self.assertFalse(page['pageInfo']['hasNextPage'])
+
+    def test_deep_pages_use_the_key_and_skip_count(self):
+        first_page = self.page(first=5)
+        with CaptureQueriesContext(connection) as ctx:
+            self.page(first=2, after=first_page['pageInfo']['endCursor'])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        sql = ctx.captured_queries[0]['sql']
+        self.assertNotIn('OFFSET', sql)
+        self.assertNotIn('COUNT', sql)
+        self.assertIn('"crm_order"."order_date" >', sql)
+
+    def test_total_count_is_opt_in(self):
+        data = self.execute(schema, '{ allOrders(first: 2, totalAmountGte: 3) { totalCount edges { node { id } } } }')
+        self.assertEqual(data['allOrders']['totalCount'], 5)
+        self.assertEqual(len(data['allOrders']['edges']), 2)
+
+
+class FilterIndexTests(TestCase):
+    """Every indexable filter in crm/filters.py must search an index, not scan."""
+
+    CASES = [
+        (CustomerFilter, {'created_at_gte': '2024-01-01T00:00:00Z'}, 'crm_customer'),
+        (CustomerFilter, {'created_at_lte': '2024-01-01T00:00:00Z'}, 'crm_customer'),
+        (ProductFilter, {'price_gte': 10}, 'crm_product'),
+        (ProductFilter, {'price_lte': 10}, 'crm_product'),
+        (ProductFilter, {'stock_gte': 10}, 'crm_product'),
+        (ProductFilter, {'stock_lte': 10}, 'crm_product'),
+        (ProductFilter, {'low_stock': True}, 'crm_product'),
+        (OrderFilter, {'order_date_gte': '2024-01-01T00:00:00Z'}, 'crm_order'),
+        (OrderFilter, {'order_date_lte': '2024-01-01T00:00:00Z'}, 'crm_order'),
+        (OrderFilter, {'total_amount_gte': 10}, 'crm_order'),
+        (OrderFilter, {'total_amount_lte': 10}, 'crm_order'),
+        (OrderFilter, {'customer_name': 'ann'}, 'crm_order'),
+    ]
+
+    def test_filters_use_an_index(self):
+        for filterset_class, data, table in self.CASES:
+            with self.subTest(filterset=filterset_class.__name__, data=data):
+                filterset = filterset_class(data, queryset=filterset_class._meta.model.objects.all())
+                plan = filterset.qs.explain()
+                self.assertIn(f'SEARCH {table} USING', plan)
+                self.assertNotIn(f'SCAN {table}', plan)
+
+    def test_low_stock_uses_partial_index(self):
+        plan = ProductFilter({'low_stock': True}, queryset=Product.objects.all()).qs.explain()
+        self.assertIn('crm_product_low_stock_idx', plan)
+
+
+class SearchTests(GraphQLTestCase):
+    def setUp(self):
+        for name, email in [("Alice Smith", "alice@example.com"), ("Bob Smithers", "bob@example.com"),
+                            ("Carol", "smith@example.org"), ("Dan", "dan@example.com")]:
+            Customer.objects.create(name=name, email=email)
+        self.pen = Product.objects.create(name="Blue pen", price=1, stock=5)
+        self.ink = Product.objects.create(name="Blue ink", price=1, stock=5)
+
+    def names(self, queryset):
+        return sorted(queryset.values_list('name', flat=True))
+
+    def test_name_filter_matches_icontains_through_the_index(self):
+        filterset = CustomerFilter({'name': 'SMITH'}, queryset=Customer.objects.all())
+        self.assertEqual(self.names(filterset.qs), ["Alice Smith", "Bob Smithers"])
+        plan = filterset.qs.explain()
+        self.assertIn('VIRTUAL TABLE', plan)
+        self.assertNotIn('LIKE', str(filterset.qs.query))
+
+    def test_icontains_arguments_go_through_the_index(self):
+        filterset = CustomerFilter({'name__icontains': 'SMITH'}, queryset=Customer.objects.all())
+        self.assertEqual(self.names(filterset.qs), ["Alice Smith", "Bob Smithers"])
+        self.assertNotIn('LIKE', str(filterset.qs.query))
+        filterset = ProductFilter({'name__icontains': 'blue'}, queryset=Product.objects.all())
+        self.assertEqual(self.names(filterset.qs), ["Blue ink", "Blue pen"])
+        self.assertNotIn('LIKE', str(filterset.qs.query))
+
+    def test_short_queries_fall_back_to_icontains(self):
+        filterset = CustomerFilter({'name': 'an'}, queryset=Customer.objects.all())
+        self.assertEqual(self.names(filterset.qs), ["Dan"])
+
+    def test_index_follows_saves_and_deletes(self):
+        dan = Customer.objects.get(name="Dan")
+        dan.name = "Dan Smithson"
+        dan.save()
+        Customer.objects.get(name="Alice Smith").delete()
+        self.assertEqual(self.names(search.filter_text(Customer.objects.all(), 'smith', ['name'])),
+                         ["Bob Smithers", "Dan Smithson"])
+
+    def test_ranked_search_connection_pages_by_rank(self):
+        query = '''query($after: String) { allCustomers(search: "smith", first: 2, after: $after) {
+            edges { node { name } } pageInfo { hasNextPage endCursor } } }'''
+        first = self.execute(schema, query)['allCustomers']
+        second = self.execute(schema, query, variables={'after': first['pageInfo']['endCursor']})['allCustomers']
+        names = [e['node']['name'] for e in first['edges'] + second['edges']]
+        self.assertEqual(sorted(names), ["Alice Smith", "Bob Smithers", "Carol"])
+        self.assertTrue(first['pageInfo']['hasNextPage'])
+        self.assertFalse(second['pageInfo']['hasNextPage'])
+
+    def test_product_name_filter_does_not_duplicate_orders(self):
+        order = Order.objects.create(customer=Customer.objects.first())
+        order.products.add(self.pen, self.ink, through_defaults={'unit_price': 1})
+        filterset = OrderFilter({'product_name': 'blue'}, queryset=Order.objects.all())
+        self.assertEqual(list(filterset.qs), [order])
+        filterset = OrderFilter({'search': 'alice'}, queryset=Order.objects.all())
+        self.assertEqual(list(filterset.qs), [order])
+
+    def test_order_search_ranks_by_the_best_match(self):
+        carol, alice = Customer.objects.get(name="Carol"), Customer.objects.get(name="Alice Smith")
+        smithing = Product.objects.create(name="Smith hammer", price=1, stock=5)
+        by_customer = Order.objects.create(customer=carol)
+        by_product = Order.objects.create(customer=Customer.objects.get(name="Dan"))
+        by_product.products.add(self.pen, smithing, through_defaults={'unit_price': 1})
+        by_both = Order.objects.create(customer=alice)
+        by_both.products.add(smithing, through_defaults={'unit_price': 1})
+
+        customer_ranks = dict(search.search(Customer.objects.all(), 'smith').values_list('pk', 'search_rank'))
+        product_ranks = dict(search.search(Product.objects.all(), 'smith').values_list('pk', 'search_rank'))
+        ranks = dict(search.search(Order.objects.all(), 'smith').values_list('pk', 'search_rank'))
+        self.assertEqual(ranks, {
+            by_customer.pk: customer_ranks[carol.pk],
+            by_product.pk: product_ranks[smithing.pk],
+            by_both.pk: min(customer_ranks[alice.pk], product_ranks[smithing.pk]),
+        })
+        query = '{ allOrders(search: "smith", first: 10) { edges { node { id } } } }'
+        ids = [int(e['node']['id']) for e in self.execute(schema, query)['allOrders']['edges']]
+        self.assertEqual(ids, sorted(ranks, key=lambda pk: (ranks[pk], pk)))
+
+    def test_bulk_created_customers_are_indexed_and_rebuild(self):
+        self.execute(schema, BulkCreateCustomersTests.MUTATION,
+                     variables={'input': [{'name': 'Eve Smithy', 'email': 'eve@example.com'}]})
+        self.assertIn("Eve Smithy", self.names(search.filter_text(Customer.objects.all(), 'smith', ['name'])))
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM crm_customer_search')
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(len(search.filter_text(Customer.objects.all(), 'smith', ['name'])), 3)
+
+
+class QueryCostTests(GraphQLViewTestCase):
+    def cost(self, schema, query, variables=None):
+        from graphql import parse
+        return complexity.analyze(schema, parse(query), variables=variables)
+
+    def test_connections_multiply_by_first_or_last(self):
+        query = 'query ($n: Int) { allOrders(first: $n) { edges { node { customer { name } } } } }'
+        # allOrders 1 + n * (edges 1 + node 1 + customer 1)
+        self.assertEqual(self.cost(schema, query, {'n': 5}), (16, 4))
+        self.assertEqual(self.cost(schema, query, {'n': 50}), (151, 4))
+
+    def test_m2m_products_are_costed_per_order(self):
+        make_orders(4)
+        query = '{ orders { products { name } } }'
+        # orders 1 + 4 rows * (products 2 + 10 * 0)
+        self.assertEqual(self.cost(schema, query), (9, 2))
+        with self.settings(GRAPHQL_QUERY_COST={'FIELD_COSTS': {'OrderType.products': 5}}):
+            self.assertEqual(self.cost(schema, query), (21, 2))
+
+    def test_root_lists_are_costed_at_their_row_count(self):
+        query = '{ customers { orderSet { id } } }'
+        self.assertEqual(self.cost(schema, query), (1, 2))
+        make_orders(3)
+        # The count is cached
+        self.assertEqual(self.cost(schema, query), (1, 2))
+        cache.clear()
+        self.assertEqual(self.cost(schema, query), (7, 2))
+        with self.settings(GRAPHQL_QUERY_COST={'ROW_COUNTS': {}}):
+            self.assertEqual(self.cost(schema, query), (201, 2))
+
+    def test_fragments_and_introspection(self):
+        make_orders(5)
+        query = '{ __schema { types { name } } customers { ...C } } fragment C on CustomerType { orderSet { id } }'
+        # customers 1 + 5 rows * (orderSet 2)
+        self.assertEqual(self.cost(schema, query), (11, 2))
+
+    def test_cost_is_reported_in_extensions(self):
+        result = self.post({'query': '{ products { name } }'})
+        self.assertEqual(result['extensions']['cost']['requested'], 1)
+        cached = self.post({'query': '{ products { name } }'})
+        self.assertEqual(cached['extensions'], result['extensions'])
+
+    def test_expensive_operations_are_rejected_before_execution(self):
+        make_orders(50, products_per_order=1)
+        complexity.row_counts()
+        with self.settings(GRAPHQL_QUERY_COST={'MAX_COST': 100}):
+            with CaptureQueriesContext(connection) as queries:
+                result = self.post({'query': '{ orders { products { name } } }'})
+        self.assertEqual(len(queries), 0)
+        self.assertIsNone(result.get('data'))
+        self.assertEqual(result['errors'][0]['extensions']['code'], 'QUERY_TOO_COMPLEX')
+        self.assertEqual(result['extensions']['cost']['requested'], 101)
+
+    def test_large_unbounded_root_lists_are_rejected(self):
+        query = '{ customers { orderSet { products { name } } } }'
+        make_orders(1)
+        self.assertNotIn('errors', self.post({'query': query}))
+        # Orders of a customer 2 + 20 * products 2 = 42 per customer
+        cache.set('crm:complexity:rows:crm.customer', 2000)
+        result = self.post({'query': query})
+        self.assertEqual(result['errors'][0]['extensions']['code'], 'QUERY_TOO_COMPLEX')
+        self.assertEqual(result['extensions']['cost']['requested'], 1 + 2000 * 42)
+
+    def test_deep_operations_are_rejected(self):
+        with self.settings(GRAPHQL_QUERY_COST={'MAX_DEPTH': 2}):
+            result = self.post({'query': '{ orders { customer { orderSet { id } } } }'})
+        self.assertEqual(result['errors'][0]['extensions']['code'], 'QUERY_TOO_DEEP')
+
+
+class AsyncGraphQLViewTests(GraphQLViewTestCase):
+    ORDERS = '{ orders { totalAmount customer { name } products { name } } }'
+
+    def setUp(self):
+        super().setUp()
+        make_orders(3)
+
+    async def apost(self, body, path='/graphql/async/'):
+        response = await self.async_client.post(path, json.dumps(body), content_type='application/json')
+        return response.json()
+
+    async def test_matches_sync_view(self):
+        response_cache.get_cache().clear()
+        result = await self.apost({'query': self.ORDERS})
+        cache.clear()
+        expected = await sync_to_async(self.post)({'query': self.ORDERS})
+        self.assertEqual(result['data'], expected['data'])
+        self.assertEqual(result['extensions']['cost']['requested'], 1 + 3 * (1 + 2))
+
+    async def test_relay_connection(self):
+        query = '{ allProducts(first: 2) { totalCount edges { node { name } } pageInfo { hasNextPage } } }'
+        request = RequestFactory().post('/graphql/')
+        request.crm_async = True
+        result = await schema.execute_async(query, context_value=request)
+        self.assertIsNone(result.errors)
+        page = result.data['allProducts']
+        self.assertEqual(page['totalCount'], 4)
+        self.assertEqual([e['node']['name'] for e in page['edges']], ['Product 0', 'Product 1'])
+        self.assertTrue(page['pageInfo']['hasNextPage'])
+
+    async def test_root_fields_are_resolved_concurrently(self):
+        from . import loaders
+        events = []
+        fetch = loaders.alist
+
+        async def traced(queryset):
+            events.append(('start', queryset.model.__name__))
+            rows = await fetch(queryset)
+            events.append(('end', queryset.model.__name__))
+            return rows
+
+        with mock.patch.object(loaders, 'alist', traced):
+            result = await self.apost({'query': '{ customers { name } products { name } }'})
+        self.assertEqual(len(result['data']['customers']), 3)
+        self.assertEqual([event for event, _ in events], ['start', 'start', 'end', 'end'])
+
+    async def test_mutations_run_on_the_sync_executor(self):
+        mutation = 'mutation { updateLowStockProducts { updatedProducts { name stock } } }'
+        result = await self.apost({'query': mutation})
+        self.assertEqual(result['data']['updateLowStockProducts']['updatedProducts'][0]['stock'], 15)
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        make_orders(3)
+
+    def test_ndjson_streams_one_line_per_order(self):
+        response = self.client.get('/exports/orders/')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['customer_email'] for row in rows], [f"customer{i}@example.com" for i in range(3)])
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True)[:2])
+        self.assertEqual(rows[0]['items'], [[pk, 1, '10.00'] for pk in product_ids])
+        self.assertEqual(rows[0]['total_amount'], '20.00')
+
+    def test_lines_reconcile_with_the_total(self):
+        order = Order.objects.order_by('pk').first()
+        OrderItem.objects.filter(order=order).update(quantity=3)
+        Order.objects.filter(pk=order.pk).update(total_amount=60)
+        row = next(iter(export.export_chunks(chunk_size=1)))[0]
+        self.assertEqual(sum(quantity * unit_price for _, quantity, unit_price in row['items']), row['total_amount'])
+        lines = b''.join(self.client.get('/exports/orders/', {'format': 'csv'}).streaming_content).decode()
+        first_product = Product.objects.order_by('pk').first().pk
+        self.assertIn(f'{first_product}:3:10.00', lines.splitlines()[1])
+
+    async def test_asgi_response_streams_from_an_async_iterator(self):
+        response = await self.async_client.get('/exports/orders/')
+        self.assertTrue(response.is_async)
+        content = b''.join([block async for block in response.streaming_content])
+        self.assertEqual(len(content.decode().splitlines()), 3)
+
+    def test_csv_with_filters(self):
+        Order.objects.filter(pk=Order.objects.order_by('pk').first().pk).update(order_date='2020-01-01T00:00:00Z')
+        response = self.client.get('/exports/orders/', {'format': 'csv', 'order_date_gte': '2021-01-01T00:00:00Z'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], ','.join(export.EXPORT_FIELDS))
+        self.assertEqual(len(lines), 3)
+
+    def test_one_product_query_per_chunk(self):
+        with CaptureQueriesContext(connection) as queries:
+            chunks = list(export.export_chunks(chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        self.assertEqual(len(queries), 3)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/exports/orders/', {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/exports/orders/', {'order_date_gte': 'soon'}).status_code, 400)
+
+    def test_command_writes_csv(self):
+        out = io.StringIO()
+        call_command('export_orders', format='csv', chunk_size=2, stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+
+
+class BatchRequestTests(GraphQLViewTestCase):
+    def test_array_of_operations_returns_array_of_results(self):
+        make_orders(2)
+        results = self.post([
+            {'query': '{ hello }', 'id': 'heartbeat'},
+            {'query': '{ customers { name } }'},
+        ])
+        self.assertEqual([r['status'] for r in results], [200, 200])
+        self.assertEqual(results[0]['id'], 'heartbeat')
+        self.assertEqual(results[0]['data'], {'hello': 'Hello, GraphQL!'})
+        self.assertEqual(len(results[1]['data']['customers']), 2)
+
+    def test_operations_share_loaders_until_a_mutation(self):
+        make_orders(2)
+        batch = [
+            {'query': '{ customers { name orderSet { id } } }'},
+            {'query': '{ customers { email orderSet { totalAmount } } }'},
+            {'query': 'mutation { updateLowStockProducts { success } }'},
+            {'query': '{ customers { id orderSet { id } } }'},
+        ]
+        with self.settings(GRAPHQL_RESPONSE_CACHE={'ENABLED': False}):
+            with CaptureQueriesContext(connection) as queries:
+                results = self.post(batch)
+        self.assertTrue(all('errors' not in r for r in results))
+        order_queries = [q for q in queries if 'FROM "crm_order"' in q['sql'] and 'UPDATE' not in q['sql']]
+        # The second operation reuses the first one's orders; the last reloads them
+        self.assertEqual(len(order_queries), 2)
+
+    def test_batch_size_is_limited(self):
+        with self.settings(GRAPHQL_MAX_BATCH_SIZE=2):
+            response = self.client.post('/graphql/', json.dumps([{'query': '{ hello }'}] * 3),
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('exceeds the limit of 2', response.json()['errors'][0]['message'])
+
+    def test_empty_and_malformed_batches(self):
+        for body in ([], [1], 'hello'):
+            response = self.client.post('/graphql/', json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+
+class GraphQLClientTests(TestCase):
+    def setUp(self):
+        graphql_client.close()
+        self.addCleanup(graphql_client.close)
+
+    def test_executes_in_process_on_one_shared_session(self):
+        Product.objects.create(name="Pen", price=1, stock=2)
+        session = graphql_client.get_session()
+        self.assertEqual(graphql_client.execute('{ hello }'), {'hello': 'Hello, GraphQL!'})
+        data = graphql_client.execute('mutation { updateLowStockProducts { success updatedProducts { stock } } }')
+        self.assertEqual(data['updateLowStockProducts']['updatedProducts'], [{'stock': 12}])
+        self.assertIs(graphql_client.get_session(), session)
+
+    def test_documents_are_validated_locally(self):
+        from graphql import GraphQLError
+        with CaptureQueriesContext(connection) as queries:
+            with self.assertRaises(GraphQLError):
+                graphql_client.execute('{ orders(orderDate_Gte: "2024-01-01") { id } }')
+        self.assertEqual(len(queries), 0)
+
+    def test_sdl_snapshot_matches_schema(self):
+        from graphql import build_schema, print_schema
+        snapshot = graphql_client.get_setting('SCHEMA_PATH').read_text()
+        self.assertEqual(print_schema(build_schema(snapshot)), print_schema(schema.graphql_schema))
+
+    def test_heartbeat_makes_no_http_request(self):
+        from . import cron
+        with mock.patch('builtins.open', mock.mock_open()) as log_file:
+            cron.log_crm_heartbeat()
+        self.assertIn('responsive', log_file().write.call_args[0][0])
+
+
+class SchedulerTests(TestCase):
+    @staticmethod
+    def aware(*args, tz=None):
+        from datetime import datetime
+        from django.utils import timezone
+        return datetime(*args, tzinfo=tz or timezone.get_current_timezone())
+
+    def test_next_run_of_crontab_expressions(self):
+        from .scheduler import CronSchedule
+        now = self.aware(2024, 5, 15, 10, 3, 30)  # a Wednesday
+        self.assertEqual(CronSchedule('*/5 * * * *').next_after(now), self.aware(2024, 5, 15, 10, 5))
+        self.assertEqual(CronSchedule('0 */12 * * *').next_after(now), self.aware(2024, 5, 15, 12, 0))
+        self.assertEqual(CronSchedule('0 2 * * 0').next_after(now), self.aware(2024, 5, 19, 2, 0))
+        self.assertEqual(CronSchedule('30 8 1 1-3 *').next_after(now), self.aware(2025, 1, 1, 8, 30))
+        # Day of month and day of week both restricted: either matches
+        self.assertEqual(CronSchedule('0 0 20 * 4').next_after(now), self.aware(2024, 5, 16, 0, 0))
+        # Steps count from the field's first value, so */2 days are the odd ones
+        every_other_day = CronSchedule('0 0 */2 * *')
+        runs = [self.aware(2024, 1, 28, 12, 0)]
+        for _ in range(4):
+            runs.append(every_other_day.next_after(runs[-1]))
+        self.assertEqual([run.day for run in runs[1:]], [29, 31, 1, 3])
+        # ... and a */N day of month is unrestricted, so the weekday must match too
+        self.assertEqual(CronSchedule('0 0 */2 * 1').next_after(now), self.aware(2024, 5, 27, 0, 0))
+        for expression in ('* * *', '60 * * * *', '0 0 30 2 *'):
+            with self.assertRaises(ValueError):
+                CronSchedule(expression).next_after(now)
+
+    def test_dst_changes_neither_skip_nor_repeat_runs(self):
+        from datetime import timedelta, timezone as dt_timezone
+        from zoneinfo import ZoneInfo
+        from django.utils import timezone
+        from .scheduler import CronSchedule
+        new_york = ZoneInfo('America/New_York')
+        with timezone.override(new_york):
+            # 02:30 does not exist on 2024-03-10; it runs as 03:30 EDT
+            spring = CronSchedule('30 2 * * *')
+            run = spring.next_after(self.aware(2024, 3, 10, 1, 0, tz=new_york))
+            self.assertEqual(run, self.aware(2024, 3, 10, 7, 30, tz=dt_timezone.utc))
+            self.assertEqual(spring.next_after(run), self.aware(2024, 3, 11, 2, 30, tz=new_york))
+            # 01:30 happens twice on 2024-11-03; it runs the first time only
+            autumn = CronSchedule('30 1 * * *')
+            run = autumn.next_after(self.aware(2024, 11, 3, 0, 0, tz=new_york))
+            # Compared in UTC, as a time in the repeated hour never equals one in another zone
+            self.assertEqual(run.astimezone(dt_timezone.utc), self.aware(2024, 11, 3, 5, 30, tz=dt_timezone.utc))
+            self.assertEqual(autumn.next_after(run), self.aware(2024, 11, 4, 1, 30, tz=new_york))
+            # Every run in the repeated hour follows the previous one
+            every = CronSchedule('*/20 * * * *')
+            runs = [self.aware(2024, 11, 3, 0, 50, tz=new_york)]
+            for _ in range(4):
+                runs.append(every.next_after(runs[-1]))
+            self.assertEqual([run.strftime('%H:%M') for run in runs[1:]], ['01:00', '01:20', '01:40', '02:00'])
+            self.assertEqual(runs[-1].astimezone(dt_timezone.utc) - runs[-2], timedelta(hours=1, minutes=20))
+
+    def test_overlapping_runs_are_skipped(self):
+        import threading
+        from .scheduler import Job
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+
+        with mock.patch('crm.scheduler.import_string', return_value=slow):
+            job = Job('* * * * *', 'crm.tests.slow')
+        worker = threading.Thread(target=job.run)
+        worker.start()
+        started.wait(5)
+        with self.assertLogs('crm.scheduler', 'WARNING'):
+            self.assertFalse(job.run())
+        release.set()
+        worker.join()
+        metrics = job.get_metrics()
+        self.assertEqual((metrics['runs'], metrics['skipped'], metrics['failures']), (1, 1, 0))
+        self.assertGreater(metrics['last_duration'], 0)
+
+    def test_due_jobs_run_on_the_pool_with_jitter(self):
+        from datetime import timedelta
+        from .scheduler import Job, Scheduler
+        calls = []
+        with mock.patch('crm.scheduler.import_string', return_value=lambda: calls.append(1)):
+            job = Job('*/5 * * * *', 'crm.tests.job')
+        clock = [self.aware(2024, 5, 15, 10, 3)]
+        scheduler = Scheduler([job], jitter=30, now=lambda: clock[0])
+        self.addCleanup(scheduler.shutdown)
+        self.assertTrue(self.aware(2024, 5, 15, 10, 5) <= job.next_run <= self.aware(2024, 5, 15, 10, 5, 30))
+        self.assertEqual(scheduler.run_pending(), [])
+        clock[0] += timedelta(minutes=3)
+        for future in scheduler.run_pending():
+            future.result()
+        self.assertEqual(calls, [1])
+        self.assertGreaterEqual(job.next_run, self.aware(2024, 5, 15, 10, 10))
+
+    def test_jitter_is_clamped_below_the_interval(self):
+        from .scheduler import Job, Scheduler
+        with mock.patch('crm.scheduler.import_string', return_value=lambda: None):
+            job = Job('*/5 * * * *', 'crm.tests.job')
+        scheduler = Scheduler([job], jitter=3600, now=lambda: self.aware(2024, 5, 15, 10, 3))
+        self.addCleanup(scheduler.shutdown)
+        self.assertTrue(self.aware(2024, 5, 15, 10, 5) <= job.next_run <= self.aware(2024, 5, 15, 10, 7, 30))
+
+    def test_command_runs_every_job_once(self):
+        out = io.StringIO()
+        cronjobs = [('*/5 * * * *', 'crm.graphql_client.close'), ('0 0 * * *', 'crm.search.get_backend')]
+        with self.settings(CRONJOBS=cronjobs):
+            call_command('run_scheduler', once=True, stdout=out)
+        self.assertIn('crm.graphql_client.close: 1 runs, 0 failures', out.getvalue())
+        self.assertIn('crm.search.get_backend: 1 runs', out.getvalue())
+
+
+class CleanInactiveCustomersTests(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        make_orders(3)
+        self.lapsed, self.active, self.idle = Customer.objects.order_by('pk')
+        Order.objects.filter(customer=self.lapsed).update(order_date=timezone.now() - timedelta(days=400))
+        Order.objects.filter(customer=self.idle).delete()
+
+    def run_command(self, **options):
+        out = io.StringIO()
+        call_command('clean_inactive_customers', stdout=out, **options)
+        return out.getvalue()
+
+    def test_deletes_customers_with_their_orders_in_chunks(self):
+        output = self.run_command(chunk_size=1)
+        self.assertEqual(list(Customer.objects.all()), [self.active])
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Order.products.through.objects.count(), 2)
+        self.assertIn('Deleted 2 inactive customers, 1 orders and 2 order lines', output)
+        self.assertIn('rows/s', output)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {search.search_table(Customer)}')
+            self.assertEqual([row[0] for row in cursor.fetchall()], [self.active.pk])
+
+    def test_dry_run_deletes_nothing(self):
+        self.assertIn('Would delete 2 inactive customers', self.run_command(dry_run=True))
+        self.assertEqual(Customer.objects.count(), 3)
+
+    def test_cron_job_appends_the_summary_to_the_log(self):
+        from . import cron
+        with tempfile.TemporaryDirectory() as directory:
+            log = Path(directory) / 'customer_cleanup_log.txt'
+            with mock.patch.object(cron, 'CUSTOMER_CLEANUP_LOG', str(log)):
+                cron.clean_inactive_customers()
+            line = log.read_text()
+        self.assertRegex(line, r'^\[\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\] Deleted 2 inactive customers, ')
+        self.assertEqual(Customer.objects.count(), 1)
+
+
+class CustomerStatsTests(GraphQLTestCase):
+    def setUp(self):
+        make_orders(3)
+        self.first, self.second, self.third = Customer.objects.order_by('pk')
+        self.order = Order.objects.create(customer=self.first, total_amount=30)
+
+    def stats(self, customer):
+        return CustomerStats.objects.get(customer=customer)
+
+    def test_new_orders_are_counted_incrementally(self):
+        row = self.stats(self.first)
+        self.assertEqual((row.order_count, row.lifetime_value), (2, 50))
+        self.assertEqual(row.last_order_date, self.order.order_date)
+        self.assertEqual(self.stats(Customer.objects.create(name="New", email="new@example.com")).order_count, 0)
+
+    def test_deleted_and_moved_orders_are_refreshed(self):
+        self.order.customer = self.second
+        self.order.save()
+        self.assertEqual((self.stats(self.first).order_count, self.stats(self.second).lifetime_value), (1, 50))
+        Order.objects.filter(customer=self.third).delete()
+        row = self.stats(self.third)
+        self.assertEqual((row.order_count, row.lifetime_value, row.last_order_date), (0, 0, None))
+
+    def test_rebuild_command_recomputes_every_row(self):
+        CustomerStats.objects.update(order_count=99)
+        CustomerStats.objects.filter(customer=self.third).delete()
+        out = io.StringIO()
+        call_command('rebuild_customer_stats', stdout=out)
+        self.assertIn('Rebuilt order statistics for 3 customers', out.getvalue())
+        self.assertEqual(
+            list(CustomerStats.objects.order_by('pk').values_list('order_count', flat=True)), [2, 1, 1]
+        )
+
+    def test_fields_are_read_without_a_query_per_customer(self):
+        with self.assertNumQueries(1):
+            data = self.execute(schema, '{ customers { orderCount lifetimeValue lastOrderDate } }')
+        self.assertEqual(data['customers'][0]['orderCount'], 2)
+        self.assertEqual(float(data['customers'][0]['lifetimeValue']), 50)
+
+    def test_filter_and_sort_on_stats(self):
+        query = '''
+            query($after: String) {
+                allCustomers(first: 1, after: $after, orderBy: "-lifetime_value", orderCountLte: 1) {
+                    edges { node { email } }
+                    pageInfo { endCursor hasNextPage }
+                }
+            }
+        '''
+        Order.objects.create(customer=self.third, total_amount=5)
+        Order.objects.filter(customer=self.third).first().delete()
+        emails, after = [], None
+        while True:
+            page = self.execute(schema, query, variables={'after': after})['allCustomers']
+            emails += [edge['node']['email'] for edge in page['edges']]
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        self.assertEqual(emails, ['customer1@example.com', 'customer2@example.com'])
+
+
+class OrderStatsTests(GraphQLViewTestCase):
+    QUERY = '''
+        query($groupBy: OrderStatsGroupBy!, $gte: Decimal) {
+            orderStats(groupBy: $groupBy, totalAmountGte: $gte) {
+                key label orderCount revenue averageOrderValue
+            }
+        }
+    '''
+
+    def setUp(self):
+        super().setUp()
+        from datetime import datetime, timezone
+        make_orders(3)
+        dates = [datetime(2024, 1, 1, 9, tzinfo=timezone.utc), datetime(2024, 1, 1, 17, tzinfo=timezone.utc),
+                 datetime(2024, 2, 3, tzinfo=timezone.utc)]
+        for order, placed, amount in zip(Order.objects.order_by('pk'), dates, [10, 30, 50]):
+            Order.objects.filter(pk=order.pk).update(order_date=placed, total_amount=amount)
+
+    def stats(self, group_by, **variables):
+        result = self.post({'query': self.QUERY, 'variables': {'groupBy': group_by, **variables}})
+        self.assertNotIn('errors', result)
+        return [
+            (row['key'], row['label'], row['orderCount'], float(row['revenue']), float(row['averageOrderValue']))
+            for row in result['data']['orderStats']
+        ]
+
+    def test_time_buckets(self):
+        self.assertEqual(self.stats('DAY'), [
+            ('2024-01-01', None, 2, 40, 20),
+            ('2024-02-03', None, 1, 50, 50),
+        ])
+        self.assertEqual([row[0] for row in self.stats('MONTH')], ['2024-01-01', '2024-02-01'])
+
+    def test_customer_and_product_buckets(self):
+        first = Customer.objects.order_by('pk').first()
+        self.assertEqual(self.stats('CUSTOMER', gte='20')[0][:3], (str(first.pk + 1), 'Customer 1', 1))
+        # Lines keep the price they were ordered at
+        Product.objects.update(price=99)
+        products = self.stats('PRODUCT')
+        self.assertEqual([row[1:4] for row in products], [('Product 0', 3, 30), ('Product 1', 3, 30)])
+
+    def test_amounts_have_two_decimal_places(self):
+        Order.objects.filter(total_amount=30).update(total_amount='30.5')
+        result = self.post({'query': self.QUERY, 'variables': {'groupBy': 'DAY'}})
+        row = result['data']['orderStats'][0]
+        self.assertEqual((row['revenue'], row['averageOrderValue']), ('40.50', '20.25'))
+        result = self.post({'query': self.QUERY, 'variables': {'groupBy': 'PRODUCT'}})
+        self.assertEqual(result['data']['orderStats'][0]['revenue'], '30.00')
+
+    def test_one_aggregate_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.stats('WEEK')
+        self.assertEqual(len(ctx.captured_queries), 1)
+        sql = ctx.captured_queries[0]['sql']
+        self.assertIn('GROUP BY', sql)
+        self.assertIn('SUM("crm_order"."total_amount")', sql)
+
+    def test_order_changes_invalidate_cached_stats(self):
+        self.stats('DAY')
+        Order.objects.create(customer=Customer.objects.first(), total_amount=5)
+        self.assertEqual(len(self.stats('DAY')), 3)
+        self.assertEqual(response_cache.get_stats()['hits'], 0)
+
+
+class OrderItemTests(TestCase):
+    def setUp(self):
+        make_orders(2)
+        self.order = Order.objects.order_by('pk').first()
+        self.product = Product.objects.get(name="Product 0")
+
+    def total(self, order=None):
+        return Order.objects.get(pk=(order or self.order).pk).total_amount
+
+    def test_line_edits_update_the_total_in_sql(self):
+        item = self.order.items.get(product=self.product)
+        item.quantity = 3
+        item.save()
+        self.assertEqual(self.total(), 40)
+        self.assertEqual(CustomerStats.objects.get(customer=self.order.customer).lifetime_value, 40)
+        item.delete()
+        self.assertEqual(self.total(), 10)
+
+    def test_m2m_changes_update_the_total(self):
+        self.order.products.remove(self.product)
+        self.assertEqual(self.total(), 10)
+        self.product.order_set.add(self.order, through_defaults={'unit_price': 5})
+        self.assertEqual(self.total(), 15)
+        self.product.order_set.clear()
+        self.assertEqual([self.total(order) for order in Order.objects.order_by('pk')], [10, 10])
+
+    def test_deleting_an_order_skips_total_updates(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.order.delete()
+        self.assertFalse(any('UPDATE "crm_order"' in q['sql'] for q in ctx.captured_queries))
+        self.assertFalse(OrderItem.objects.filter(order_id=self.order.pk).exists())
+
+
+@mock.patch.dict('django.conf.settings.GRAPHQL_PROFILING', {'EXPOSE': True})
+class ProfilingTests(GraphQLViewTestCase):
+    ORDERS = 'query Orders { orders { totalAmount customer { email } products { name } } }'
+
+    def setUp(self):
+        super().setUp()
+        profiling.metrics.reset()
+        make_orders(3)
+        # Costing the root lists counts their rows once per ROW_COUNT_TIMEOUT
+        complexity.row_counts()
+
+    def profiled(self, body, path='/graphql/', **headers):
+        response = self.client.post(
+            path, json.dumps(body), content_type='application/json', headers={'X-GraphQL-Profile': '1', **headers}
+        )
+        return response.json()
+
+    def test_profile_in_extensions_credits_queries_to_fields(self):
+        profile = self.profiled({'query': self.ORDERS})['extensions']['profile']
+        self.assertEqual(profile['operation'], 'Orders')
+        self.assertEqual(profile['queries'], 2)
+        resolvers = profile['resolvers']
+        # The optimizer's join and prefetch run in the root resolver
+        self.assertEqual((resolvers['orders']['calls'], resolvers['orders']['queries']), (1, 2))
+        self.assertEqual((resolvers['orders.products']['calls'], resolvers['orders.products']['queries']), (3, 0))
+        self.assertEqual(profile['nPlusOne'], [])
+
+    def test_n_plus_one_is_flagged(self):
+        def customer_of(loaders, order):
+            return Customer.objects.get(pk=order.customer_id)
+
+        with mock.patch('crm.loaders.Loaders.customer_of', customer_of):
+            profile = self.profiled({'query': self.ORDERS})['extensions']['profile']
+        self.assertEqual(profile['nPlusOne'], ['orders.customer'])
+        self.assertEqual(profile['resolvers']['orders.customer']['queries'], 3)
+
+    def test_profile_needs_header_and_expose(self):
+        self.assertNotIn('profile', self.post({'query': self.ORDERS}).get('extensions', {}))
+        with mock.patch.dict('django.conf.settings.GRAPHQL_PROFILING', {'EXPOSE': False}):
+            self.assertNotIn('profile', self.profiled({'query': '{ hello }'}).get('extensions', {}))
+
+    def test_async_view_is_profiled(self):
+        profile = self.profiled({'query': self.ORDERS}, path='/graphql/async/')['extensions']['profile']
+        self.assertEqual(profile['queries'], 2)
+        self.assertEqual(profile['resolvers']['orders.customer']['calls'], 3)
+
+    def test_metrics_endpoint(self):
+        self.post({'query': self.ORDERS})
+        self.post({'query': self.ORDERS})
+        self.post({'query': '{ hello }'})
+        response = self.client.get('/metrics')
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('# TYPE crm_graphql_operation_duration_seconds summary', text)
+        self.assertIn('crm_graphql_operation_duration_seconds_count{operation="Orders"} 2', text)
+        self.assertIn('crm_graphql_operation_duration_seconds_count{operation="anonymous"} 1', text)
+        # The second request was served from the response cache
+        self.assertIn('crm_graphql_operation_queries_sum{operation="Orders"} 2', text)
+        self.assertIn('crm_graphql_operation_queries{operation="Orders",quantile="0.5"}', text)
+
+
+class DatabaseTuningTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_new_connections_are_tuned(self):
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+
+    def test_file_databases_switch_to_wal(self):
+        with tempfile.TemporaryDirectory() as directory:
+            raw = sqlite3.connect(Path(directory) / 'tuned.sqlite3')
+            database.apply(raw)
+            self.assertEqual(raw.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            raw.close()
+
+    def test_settings(self):
+        with self.settings(SQLITE_TUNING={'MMAP_SIZE': None, 'JOURNAL_MODE': 'TRUNCATE'}):
+            statements = database.pragmas()
+        self.assertIn('PRAGMA journal_mode = TRUNCATE', statements)
+        self.assertFalse(any('mmap_size' in statement for statement in statements))
+        with self.settings(SQLITE_TUNING={'ENABLED': False}):
+            self.assertEqual(database.pragmas(), [])
+        with self.settings(SQLITE_TUNING={'SYNCHRONOUS': 'OFF; DROP TABLE crm_order'}):
+            with self.assertRaises(ValueError):
+                database.pragmas()
+
+    def test_concurrency_benchmark(self):
+        result = benchmark.concurrency(database.pragmas(), readers=2, writers=1, seconds=0.2)
+        self.assertGreater(result['reads_per_sec'], 0)
+        self.assertGreater(result['writes_per_sec'], 0)
+        self.assertEqual(result['errors'], 0)
+        baseline = {'scenarios': {}, 'concurrency': {'tuned': {'reads_per_sec': 100, 'writes_per_sec': 100}}}
+        results = {'scenarios': {}, 'concurrency': {'tuned': {'reads_per_sec': 100, 'writes_per_sec': 50}}}
+        self.assertEqual(benchmark.compare(results, baseline), ["concurrency: writes_per_sec 100 -> 50"])
+        baseline['concurrency']['tuned_asgi'] = {'reads_per_sec': 100, 'writes_per_sec': 100}
+        results['concurrency']['tuned_asgi'] = {'reads_per_sec': 10, 'writes_per_sec': 100}
+        self.assertEqual(benchmark.compare(results, baseline)[1:], ["concurrency (tuned_asgi): reads_per_sec 100 -> 10"])
+
+
+class BenchmarkTests(TestCase):
+    DATASET = benchmark.Dataset(customers=8, products=5, orders=20, items_per_order=3, seed=7)
+
+    def snapshot(self):
+        items = OrderItem.objects.order_by('pk').values_list('product__name', 'quantity', 'unit_price')
+        return list(items), list(Customer.objects.order_by('pk').values_list('phone', flat=True))
+
+    def test_generator_is_seeded(self):
+        counts = benchmark.generate(self.DATASET)
+        self.assertEqual(counts['orders'], 20)
+        first = self.snapshot()
+        order = Order.objects.first()
+        self.assertEqual(
+            order.total_amount, sum(item.quantity * item.unit_price for item in order.items.all())
+        )
+        self.assertEqual(CustomerStats.objects.count(), 8)
+
+        Customer.objects.all().delete()
+        Product.objects.all().delete()
+        benchmark.generate(self.DATASET)
+        self.assertEqual(self.snapshot(), first)
+
+    def test_scenarios_cover_every_filter_and_leave_data_unchanged(self):
+        benchmark.generate(self.DATASET)
+        scenarios = {scenario.name: scenario for scenario in benchmark.build_scenarios()}
+        for name in OrderFilter.base_filters:
+            self.assertIn(f'filter.allOrders.{to_camel_case(name)}', scenarios)
+
+        orders = Order.objects.count()
+        result = benchmark.run_scenario(scenarios['mutation.createOrder'], iterations=2, warmup=1)
+        self.assertEqual(Order.objects.count(), orders)
+        self.assertGreater(result['queries'], 0)
+        self.assertEqual(benchmark.run_scenario(scenarios['root.orders'], iterations=1)['queries'], 2)
+
+    def test_cron_scenarios_do_not_write_the_job_logs(self):
+        benchmark.generate(self.DATASET)
+        scenarios = [s for s in benchmark.build_scenarios() if s.name.startswith('cron.')]
+        with tempfile.TemporaryDirectory() as directory:
+            logs = {log: str(Path(directory) / log.rsplit('.', 1)[1]) for log in benchmark.CRON_LOGS}
+            with contextlib.ExitStack() as stack:
+                for log, path in logs.items():
+                    stack.enter_context(mock.patch(log, path))
+                for scenario in scenarios:
+                    benchmark.run_scenario(scenario, iterations=1, warmup=1)
+            self.assertEqual(list(Path(directory).iterdir()), [])
+        self.assertEqual(len(scenarios), 4)
+
+    def test_compare_flags_slowdowns_and_extra_queries(self):
+        baseline = {'scenarios': {
+            'a': {'p50_ms': 10, 'queries': 2},
+            'b': {'p50_ms': 10, 'queries': 2},
+        }}
+        results = {'scenarios': {
+            'a': {'p50_ms': 12, 'queries': 2},
+            'b': {'p50_ms': 20, 'queries': 3},
+            'new': {'p50_ms': 1, 'queries': 1},
+        }}
+        self.assertEqual(benchmark.compare(results, baseline), ["b: p50 10ms -> 20ms (+100%)", "b: 2 -> 3 queries"])
+
+    def test_startup_is_timed_in_a_fresh_interpreter(self):
+        result = benchmark.startup(runs=1)
+        self.assertGreater(result['schema_ms'], 0)
+        self.assertGreater(result['total_ms'], result['setup_ms'])
+        baseline = {'startup': {'total_ms': result['total_ms'] / 2}, 'scenarios': {}}
+        self.assertEqual(len(benchmark.compare({'startup': result, 'scenarios': {}}, baseline)), 1)
+
+    def test_slower_schema_build_fails_the_comparison(self):
+        baseline = {'startup': {'setup_ms': 300, 'schema_ms': 22, 'total_ms': 322}, 'scenarios': {}}
+        results = {'startup': {'setup_ms': 300, 'schema_ms': 38, 'total_ms': 338}, 'scenarios': {}}
+        self.assertEqual(benchmark.compare(results, baseline), ["startup: schema_ms 22ms -> 38ms (+73%)"])
+
+
+class QueryCountTests(TestCase):
+    def test_every_root_field_is_recorded(self):
+        self.assertEqual(query_counts.uncovered(schema), [])
+
+    def test_queries_are_constant_in_rows_and_match_the_snapshot(self):
+        runs = {size: query_counts.record_all(size) for size in query_counts.SIZES}
+        growing = query_counts.growing(runs)
+        self.assertFalse(growing, "\n".join(growing))
+        regressions = query_counts.compare(runs[max(runs)], query_counts.load())
+        self.assertFalse(
+            regressions, "Re-record with manage.py record_query_counts if intended:\n" + "\n".join(regressions)
+        )
+
+    def test_normalize_drops_literals_and_list_lengths(self):
+        self.assertEqual(
+            query_counts.normalize(
+                'SELECT "a" FROM "t" WHERE "id" IN (1, 2, 3) AND "name" = \'it\'\'s\' LIMIT 21'
+            ),
+            'SELECT "a" FROM "t" WHERE "id" IN (...) AND "name" = ? LIMIT ?',
+        )
+        self.assertEqual(
+            query_counts.normalize('INSERT INTO "t" ("a", "b") VALUES (1, NULL), (2, \'x\')'),
+            'INSERT INTO "t" ("a", "b") VALUES (...)',
+        )
+
+    def test_compare_flags_extra_queries_and_changed_sql(self):
+        expected = {
+            'A': {'queries': 2},
+            'B': {'queries': 1, 'sql': ['SELECT ?']},
+            'C': {'queries': 3},
+        }
+        recorded = {'A': ['q'] * 3, 'B': ['SELECT ? FROM "t"'], 'C': ['q'], 'D': []}
+        messages = query_counts.compare(recorded, expected)
+        self.assertEqual([message.splitlines()[0] for message in messages], [
+            "A: 2 -> 3 queries", "B: SQL changed", "D: not in the snapshot",
+        ])
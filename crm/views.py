@@ -1,3 +1,365 @@
-from django.shortcuts import render
+import json
+from collections import namedtuple
+from inspect import isawaitable
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBadRequest
+from django.views.decorators.http import require_GET
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import GraphQLError, OperationType, execute, get_operation_ast
+from graphql.execution import ExecutionResult
+
+from . import complexity, export, profiling, response_cache
+from .filters import OrderFilter
+from .loaders import reset_loaders
+from .models import Order
+from .persisted_queries import get_document_store, get_setting, query_hash
+
+DEFAULT_MAX_BATCH_SIZE = 20
+
+# What execute_graphql_request needs once a request has been checked
+ExecutionPlan = namedtuple('ExecutionPlan', 'document operation_ast extensions cache_key')
+
+
+class PersistedQueryGraphQLView(GraphQLView):
+    """GraphQLView that executes cached, pre-validated documents.
+
+    Implements automatic persisted queries: a client may send only
+    ``extensions.persistedQuery.sha256Hash``; on a miss it gets a
+    ``PERSISTED_QUERY_NOT_FOUND`` error and resends the hash with the full
+    query text, which is then cached. Full-text requests go through the same
+    cache, so a hot query is parsed and validated once per process.
+
+    A JSON array of operations is executed as a batch of at most
+    ``GRAPHQL_MAX_BATCH_SIZE``, answered with an array of results; the
+    operations share the request's loaders, reset after each mutation.
+
+    Results of read-only operations are served from ``response_cache``.
+    Every operation is costed by ``complexity`` before it runs; operations
+    over budget are rejected and the cost is reported in ``extensions``.
+    Operations are timed by ``profiling``, whose per-field profile is added
+    to ``extensions`` when the debug header is sent.
+    """
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        return self.build_response(request, execution_result, id, show_graphiql)
+
+    def build_response(self, request, execution_result, id, show_graphiql=False):
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        status_code = 200
+        if execution_result:
+            response = {}
+
+            if execution_result.errors:
+                set_rollback()
+                response["errors"] = [
+                    self.format_error(e) for e in execution_result.errors
+                ]
+
+            if execution_result.errors and any(
+                not getattr(e, "path", None) for e in execution_result.errors
+            ):
+                status_code = 400
+            else:
+                response["data"] = execution_result.data
+
+            # GraphQLView.get_response drops extensions
+            if execution_result.extensions:
+                response["extensions"] = execution_result.extensions
+
+            if self.batch:
+                response["id"] = id
+                response["status"] = status_code
+
+            result = self.json_encode(request, response, pretty=show_graphiql)
+        else:
+            result = None
+
+        return result, status_code
+
+    def parse_body(self, request):
+        if self.get_content_type(request) != "application/json":
+            return super().parse_body(request)
+        try:
+            body = json.loads(request.body.decode("utf-8"))
+        except (UnicodeDecodeError, ValueError):
+            raise HttpError(HttpResponseBadRequest("POST body sent invalid JSON."))
+
+        # Batch mode is decided per request, by the shape of the body
+        self.batch = isinstance(body, list)
+        if self.batch:
+            max_size = getattr(settings, 'GRAPHQL_MAX_BATCH_SIZE', DEFAULT_MAX_BATCH_SIZE)
+            if not body:
+                raise HttpError(HttpResponseBadRequest("Received an empty list in the batch request."))
+            if len(body) > max_size:
+                raise HttpError(HttpResponseBadRequest(
+                    f"Batch of {len(body)} operations exceeds the limit of {max_size}."
+                ))
+            if not all(isinstance(entry, dict) for entry in body):
+                raise HttpError(HttpResponseBadRequest("Every batch entry must be a JSON query."))
+        elif not isinstance(body, dict):
+            raise HttpError(HttpResponseBadRequest("The received data is not a valid JSON query."))
+        return body
+
+    def get_persisted_query_hash(self, request, data):
+        extensions = request.GET.get('extensions') or data.get('extensions')
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        if extensions is None:
+            return None
+        if not isinstance(extensions, dict):
+            raise HttpError(HttpResponseBadRequest("Extensions must be a JSON object."))
+        persisted_query = extensions.get('persistedQuery') or {}
+        if not isinstance(persisted_query, dict):
+            raise HttpError(HttpResponseBadRequest("persistedQuery must be a JSON object."))
+        return persisted_query.get('sha256Hash')
+
+    def get_document(self, request, data, query):
+        """Return ``(document, errors)`` for the request."""
+        store = get_document_store(self.schema)
+        sha256 = self.get_persisted_query_hash(request, data)
+
+        if not query:
+            document = store.get(sha256)
+            if document is None:
+                return None, [GraphQLError(
+                    "PersistedQueryNotFound",
+                    extensions={'code': 'PERSISTED_QUERY_NOT_FOUND'},
+                )]
+            return document, []
+
+        if sha256 is None:
+            sha256 = query_hash(query)
+        elif sha256 != query_hash(query):
+            return None, [GraphQLError("Provided sha256Hash does not match query")]
+
+        if get_setting('ONLY_REGISTERED', False) and not store.is_registered(sha256):
+            return None, [GraphQLError("Only registered operations may be executed")]
+        return store.document_for(query, sha256)
+
+    def plan_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        """Resolve, check and cost a request before it is executed.
+
+        Returns ``(result, plan)``. ``plan`` is ``None`` when the request is
+        answered without executing, by ``result`` (an error, a cached
+        response, or ``None`` to show GraphiQL).
+        """
+        if not query and not self.get_persisted_query_hash(request, data):
+            if show_graphiql:
+                return None, None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        document, errors = self.get_document(request, data, query)
+        if errors:
+            return ExecutionResult(data=None, errors=errors), None
+
+        operation_ast = get_operation_ast(document, operation_name)
+        profile = profiling.current_operation()
+        if profile is not None and operation_ast and operation_ast.name:
+            profile.name = operation_ast.name.value
+        if request.method.lower() == "get":
+            if operation_ast and operation_ast.operation != OperationType.QUERY:
+                if show_graphiql:
+                    return None, None
+
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["POST"],
+                        "Can only perform a {} operation from a POST request.".format(
+                            operation_ast.operation.value
+                        ),
+                    )
+                )
+
+        extensions, errors = complexity.check(
+            self.schema, document, operation_name, variables, getattr(request, 'crm_row_counts', None)
+        )
+        if errors:
+            return ExecutionResult(data=None, errors=errors, extensions=extensions), None
+
+        key = None
+        if operation_ast and operation_ast.operation == OperationType.QUERY:
+            key = response_cache.cache_key(self.schema, document, operation_name, variables)
+            if key is not None:
+                cached = response_cache.lookup(key)
+                if cached is not None:
+                    return ExecutionResult(data=cached, extensions=extensions), None
+
+        return None, ExecutionPlan(document, operation_ast, extensions, key)
+
+    def get_execution_options(self, request, variables, operation_name):
+        options = {
+            "root_value": self.get_root_value(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "context_value": self.get_context(request),
+            "middleware": self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            options["execution_context_class"] = self.execution_context_class
+        return options
+
+    def execute_plan(self, request, plan, variables, operation_name):
+        is_mutation = plan.operation_ast and plan.operation_ast.operation == OperationType.MUTATION
+        try:
+            options = self.get_execution_options(request, variables, operation_name)
+            if is_mutation and (
+                graphene_settings.ATOMIC_MUTATIONS is True
+                or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+            ):
+                with transaction.atomic():
+                    result = execute(self.schema.graphql_schema, plan.document, **options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            return execute(self.schema.graphql_schema, plan.document, **options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+        finally:
+            if is_mutation:
+                # Later operations of a batch must not see rows loaded before the write
+                reset_loaders(request)
+
+    def finish_request(self, plan, result):
+        if plan.cache_key is not None and not result.errors:
+            response_cache.store(plan.cache_key, result.data)
+        result.extensions = {**(result.extensions or {}), **plan.extensions}
+        return result
+
+    def add_profile(self, profile, result):
+        if result is not None and profile is not None and profile.detailed:
+            result.extensions = {**(result.extensions or {}), 'profile': profile.as_extension()}
+        return result
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        with profiling.operation(operation_name) as profile:
+            result, plan = self.plan_request(request, data, query, variables, operation_name, show_graphiql)
+            if plan is not None:
+                result = self.finish_request(plan, self.execute_plan(request, plan, variables, operation_name))
+            return self.add_profile(profile, result)
+
+
+class AsyncGraphQLView(PersistedQueryGraphQLView):
+    """PersistedQueryGraphQLView running queries on graphql's async executor.
+
+    Served natively under ASGI. Root fields of a query are resolved
+    concurrently, and resolvers fetch rows through the async ORM (see
+    ``Loaders.resolve_list``), so a worker is not blocked while it waits on
+    the database. Mutations run serially on the request's sync thread, as
+    in the sync view.
+    """
+
+    view_is_async = True
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # csrf_exempt() wraps views in a sync function before Django 5.0
+        view.csrf_exempt = True
+        return view
+
+    def execute_plan(self, request, plan, variables, operation_name):
+        request.crm_async = False
+        return super().execute_plan(request, plan, variables, operation_name)
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            data = self.parse_body(request)
+            if request.method.lower() not in ("get", "post") or (
+                self.graphiql and self.can_display_graphiql(request, data)
+            ):
+                # Errors and GraphiQL need no execution
+                return super().dispatch(request, *args, **kwargs)
+
+            if self.batch:
+                responses = [await self.aget_response(request, entry) for entry in data]
+                result = "[{}]".format(",".join([response[0] for response in responses]))
+                status_code = responses and max(response[1] for response in responses) or 200
+            else:
+                result, status_code = await self.aget_response(request, data)
+
+            return HttpResponse(status=status_code, content=result, content_type="application/json")
+
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+
+    async def aget_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        execution_result = await self.aexecute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        return self.build_response(request, execution_result, id, show_graphiql)
+
+    async def aexecute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        # The sync ORM may not run on the event loop
+        request.crm_row_counts = await complexity.arow_counts()
+        with profiling.operation(operation_name) as profile:
+            result, plan = self.plan_request(request, data, query, variables, operation_name, show_graphiql)
+            if plan is not None:
+                result = self.finish_request(plan, await self.aexecute_plan(request, plan, variables, operation_name))
+            return self.add_profile(profile, result)
+
+    async def aexecute_plan(self, request, plan, variables, operation_name):
+        if not plan.operation_ast or plan.operation_ast.operation != OperationType.QUERY:
+            return await sync_to_async(self.execute_plan)(request, plan, variables, operation_name)
+
+        request.crm_async = True
+        try:
+            options = self.get_execution_options(request, variables, operation_name)
+            result = execute(self.schema.graphql_schema, plan.document, **options)
+            if isawaitable(result):
+                result = await result
+            return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+@require_GET
+def export_orders(request):
+    """Stream orders matching the ``OrderFilter`` parameters as NDJSON or CSV.
+
+    ``?format=csv`` selects CSV; the default is NDJSON.
+    """
+    format = request.GET.get('format', 'ndjson')
+    if format not in export.RENDERERS:
+        return JsonResponse({'errors': [f"Unknown format: {format}"]}, status=400)
+    filterset = OrderFilter(request.GET, queryset=Order.objects.all())
+    if not filterset.is_valid():
+        return JsonResponse({'errors': filterset.errors.get_json_data()}, status=400)
+
+    # An async iterator under ASGI, which would otherwise buffer the whole export
+    render = export.arender if isinstance(request, ASGIRequest) else export.render
+    response = StreamingHttpResponse(render(filterset.qs, format), content_type=export.CONTENT_TYPES[format])
+    response['Content-Disposition'] = f'attachment; filename="orders.{format}"'
+    return response
+
+
+@require_GET
+def metrics(request):
+    """Per-operation GraphQL latency and query counts in the Prometheus text format."""
+    return HttpResponse(profiling.metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')